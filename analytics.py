@@ -0,0 +1,249 @@
+# analytics.py — data preparation and per-tab computations for app.py
+"""
+Pure pandas/statsmodels functions behind the Analytics Workbench (app.py).
+Kept free of Streamlit so they can be cached by the app and timed by bench.py.
+"""
+import pandas as pd
+import numpy as np
+
+import statsmodels.api as sm
+from statsmodels.stats.outliers_influence import variance_inflation_factor
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from scipy.stats import zscore
+
+import optimizer as op
+
+# ----------------------- Data utilities -----------------------
+def load_df(src):
+    if hasattr(src, "read"):  # uploaded file
+        df = pd.read_csv(src)
+    else:
+        df = pd.read_csv(src)
+
+    # Schema coercion
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    for c in ['impressions','clicks','page_visits','leads','registrations',
+              'opportunities','orders','spend','target_cpl']:
+        if c not in df.columns:
+            df[c] = 0
+        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+
+    for c, default in [('market','All Markets'),('segment','—'),('source','Unknown'),('campaign','Unknown')]:
+        if c not in df.columns: df[c] = default
+        df[c] = df[c].fillna(default)
+
+    # Derived metrics
+    df['reg_rate']   = df['registrations'] / df['leads'].replace(0, np.nan)
+    df['opp_rate']   = df['opportunities'] / df['leads'].replace(0, np.nan)
+    df['order_rate'] = df['orders'] / df['leads'].replace(0, np.nan)
+    df['cpl'] = df['spend'] / df['leads'].replace(0, np.nan)
+    return df
+
+def ci_normal(p, n, z=1.96):
+    """Normal approx CI for a proportion."""
+    if n <= 0 or pd.isna(p): return (np.nan, np.nan)
+    se = np.sqrt(p*(1-p)/n)
+    return (p - z*se, p + z*se)
+
+def add_ci_rates(g):
+    out = []
+    for _, r in g.iterrows():
+        rr_l, rr_u = ci_normal(r['reg_rate'], r['leads'])
+        or_l, or_u = ci_normal(r['order_rate'], r['leads'])
+        out.append((rr_l, rr_u, or_l, or_u))
+    g[['reg_ci_lo','reg_ci_hi','ord_ci_lo','ord_ci_hi']] = pd.DataFrame(out, index=g.index)
+    return g
+
+def ensure_nonneg(s): return s.fillna(0).clip(lower=0)
+
+def apply_filters(df, months=None, markets=None, segments=None, sources=None, campaigns=None):
+    f = df.copy()
+    if months:   f = f[f['date'].dt.to_period('M').astype(str).isin(months)]
+    if markets:  f = f[f['market'].isin(markets)]
+    if segments: f = f[f['segment'].isin(segments)]
+    if sources:  f = f[f['source'].isin(sources)]
+    if campaigns:f = f[f['campaign'].isin(campaigns)]
+    return f
+
+# ----------------------- Overview -----------------------
+def funnel_values(f):
+    return [
+        ensure_nonneg(f['leads']).sum(),
+        ensure_nonneg(f['registrations']).sum(),
+        ensure_nonneg(f['opportunities']).sum(),
+        ensure_nonneg(f['orders']).sum()
+    ]
+
+def channel_mix(f):
+    mix = (f.groupby('source', as_index=False)
+             [['leads','registrations','orders','spend']]
+             .sum()
+             .assign(reg_rate=lambda d: d['registrations']/d['leads'].replace(0,np.nan),
+                     order_rate=lambda d: d['orders']/d['leads'].replace(0,np.nan)))
+    # add CI
+    return add_ci_rates(mix)
+
+def market_source_matrix(f):
+    pvt = (f.groupby(['market','source'], as_index=False)
+             [['leads','registrations','orders','spend']]
+             .sum())
+    pvt['reg_rate'] = pvt['registrations']/pvt['leads'].replace(0,np.nan)
+    pvt['order_rate'] = pvt['orders']/pvt['leads'].replace(0,np.nan)
+    pvt['cpl'] = pvt['spend']/pvt['leads'].replace(0,np.nan)
+    return pvt
+
+# ----------------------- Diagnostics -----------------------
+def campaign_outliers(f, metric):
+    cg = (f.groupby('campaign', as_index=False)
+            [['leads','registrations','orders','spend']]
+            .sum())
+    cg['reg_rate'] = cg['registrations']/cg['leads'].replace(0,np.nan)
+    cg['order_rate'] = cg['orders']/cg['leads'].replace(0,np.nan)
+    cg['cpl'] = cg['spend']/cg['leads'].replace(0,np.nan)
+    cg['z'] = zscore(cg[metric].astype(float).replace([np.inf,-np.inf], np.nan), nan_policy='omit')
+    cg['outlier'] = (np.abs(cg['z']) > 2.5)
+    return cg
+
+def control_series(f):
+    """Monthly reg rate with mean and ±3σ limits: (ts, mu, ucl, lcl)."""
+    ts = (f.groupby('date', as_index=False)[['leads','registrations']].sum())
+    ts['reg_rate'] = ts['registrations']/ts['leads'].replace(0,np.nan)
+    mu = ts['reg_rate'].mean()
+    sd = ts['reg_rate'].std()
+    return ts, mu, mu + 3*sd, mu - 3*sd
+
+# ----------------------- Cohorts -----------------------
+def cohort_rates(f, cohort_dim):
+    """Fallback when no cohort table is available: reg rate by lead month."""
+    c = (f.assign(lead_month=f['date'].dt.to_period('M').astype(str))
+           .groupby(['lead_month', cohort_dim], as_index=False)
+           [['leads','registrations']].sum())
+    c['reg_rate'] = c['registrations']/c['leads'].replace(0,np.nan)
+    return c
+
+def load_cohorts(src):
+    """campaign_cohorts.csv written by consolidate.py."""
+    co = pd.read_csv(src)
+    co['lead_month'] = pd.to_datetime(co['lead_month'], errors='coerce')
+    for c in ['months_since','leads','registrations','opportunities','orders']:
+        if c not in co.columns:
+            co[c] = 0
+        co[c] = pd.to_numeric(co[c], errors='coerce').fillna(0)
+    co['months_since'] = co['months_since'].astype(int)
+    for c, default in [('market','All Markets'),('segment','—'),('source','Unknown')]:
+        if c not in co.columns: co[c] = default
+        co[c] = co[c].fillna(default)
+    return co.dropna(subset=['lead_month'])
+
+def filter_cohorts(co, months=None, markets=None, segments=None, sources=None):
+    if months:   co = co[co['lead_month'].dt.to_period('M').astype(str).isin(months)]
+    if markets:  co = co[co['market'].isin(markets)]
+    if segments: co = co[co['segment'].isin(segments)]
+    if sources:  co = co[co['source'].isin(sources)]
+    return co
+
+def _cohort_matrix(co, by, metric, as_of=None):
+    """
+    Cumulative conversions per (by, lead_month) row × months since lead, plus the
+    matching leads. Cells a cohort has not reached yet by `as_of` (default: the
+    latest lead month) are masked out so young cohorts don't drag the curves down.
+    """
+    m = (co.groupby([by, 'lead_month', 'months_since'])[metric].sum()
+           .unstack('months_since', fill_value=0))
+    m = m.reindex(columns=range(int(co['months_since'].max()) + 1), fill_value=0).cumsum(axis=1)
+    leads = (co[co['months_since'] == 0].groupby([by, 'lead_month'])['leads'].sum()
+               .reindex(m.index, fill_value=0).to_numpy())
+    latest = co['lead_month'].max() if as_of is None else as_of
+    lm = m.index.get_level_values('lead_month')
+    age = np.asarray((latest.year - lm.year) * 12 + (latest.month - lm.month))
+    observed = age[:, None] >= m.columns.to_numpy()[None, :]
+    num = pd.DataFrame(np.where(observed, m.to_numpy(), 0), index=m.index, columns=m.columns)
+    den = pd.DataFrame(np.where(observed, leads[:, None], 0), index=m.index, columns=m.columns)
+    return num, den
+
+def cohort_curves(co, cohort_dim, metric, as_of=None):
+    """Long frame: cohort_dim, months_since, cum_rate (converted / leads), leads."""
+    num, den = _cohort_matrix(co, cohort_dim, metric, as_of)
+    num, den = num.groupby(level=cohort_dim).sum(), den.groupby(level=cohort_dim).sum()
+    rate = num / den.replace(0, np.nan)
+    melt = lambda d, name: (d.rename_axis(columns='months_since').reset_index()
+                             .melt(id_vars=cohort_dim, var_name='months_since', value_name=name))
+    out = melt(rate, 'cum_rate').merge(melt(den, 'leads'), on=[cohort_dim, 'months_since'])
+    return out[out['leads'] > 0].reset_index(drop=True)
+
+def cohort_triangle(co, metric, as_of=None):
+    """Lead month × months since lead cumulative rate (NaN where not yet observed)."""
+    num, den = _cohort_matrix(co.assign(_all='All'), '_all', metric, as_of)
+    tri = num / den.replace(0, np.nan)
+    tri.index = tri.index.get_level_values('lead_month').strftime('%Y-%m')
+    return tri
+
+# ----------------------- Drivers (model) -----------------------
+def drivers_table(f, target):
+    """Monthly-by-campaign modelling table: (X, y)."""
+    Xdf = (f.groupby(['date','market','segment','source','campaign'], as_index=False)
+             [['leads','registrations','opportunities','orders','spend','clicks','impressions']]
+             .sum())
+    # Simple feature set
+    features = ['leads','registrations','opportunities','spend','clicks','impressions']
+    # Avoid perfect leakage: if target=registrations, drop 'registrations' as predictor
+    feat = [x for x in features if x != target]
+    X = Xdf[feat].fillna(0).astype(float)
+    y = Xdf[target].astype(float)
+    return X, y
+
+def fit_ols(X, y):
+    """Add constant and fit: (Xc, model)."""
+    Xc = sm.add_constant(X, has_constant='add')
+    return Xc, sm.OLS(y, Xc).fit()
+
+def vif_table(Xc):
+    return pd.DataFrame({
+        "feature": Xc.columns,
+        "VIF": [variance_inflation_factor(Xc.values, i) for i in range(Xc.shape[1])]
+    })
+
+# ----------------------- Forecast -----------------------
+def forecast_series(f, metric):
+    ts = (f.groupby('date', as_index=False)[[metric]].sum()).dropna()
+    return ts.sort_values('date')
+
+def fit_forecast(ts, metric):
+    hw = ExponentialSmoothing(ts[metric], trend='add', seasonal=None, initialization_method='estimated')
+    return hw.fit()
+
+def forecast_frame(ts, res, horizon):
+    fcast = res.forecast(horizon)
+    return pd.DataFrame({"date": pd.date_range(ts['date'].max()+pd.offsets.MonthBegin(), periods=horizon, freq='MS'),
+                         "forecast": fcast.values})
+
+# ----------------------- Budget optimizer -----------------------
+def response_curves(f, keys=('market','source'), fallback_cpl=None):
+    """
+    Monthly spend → leads curves per unit (optimizer.fit_response), plus the unit's
+    registrations per lead and target CPL (NaN when no target is set). The target
+    is read from the data: the unit's smallest positive target_cpl.
+
+    fallback_cpl ({source: target}) is for older consolidated files that summed
+    target_cpl over the grain: a unit whose values are all whole multiples of its
+    source's fallback gets the fallback instead.
+    """
+    keys = list(keys)
+    curves = op.fit_response(f, keys)
+    tot = f.groupby(keys)[['leads','registrations']].sum()
+    tot['reg_per_lead'] = tot['registrations'] / tot['leads'].replace(0, np.nan)
+    pos = f.loc[f['target_cpl'] > 0, keys + ['target_cpl']]
+    tot['target_cpl'] = pos.groupby(keys)['target_cpl'].min()
+    if fallback_cpl is not None and 'source' in keys:
+        k = pos['target_cpl'] / pos['source'].map(fallback_cpl)   # NaN for sources without a fallback
+        tot['summed'] = pd.Series(np.isclose(k, k.round()) & (k >= 1), index=pos.index).groupby(
+            [pos[c] for c in keys]).all()
+        summed = tot['summed'].fillna(False).astype(bool)
+        tot.loc[summed, 'target_cpl'] = tot.index[summed].get_level_values('source').map(fallback_cpl)
+    curves = curves.merge(tot[['reg_per_lead','target_cpl']].reset_index(), on=keys, how='left')
+    curves['reg_per_lead'] = curves['reg_per_lead'].fillna(0)
+    return curves
+
+# ----------------------- A/B test -----------------------
+def ab_groups(f, dim):
+    return f.groupby(dim, as_index=False)[['leads','registrations']].sum()
@@ -5,7 +5,13 @@ import numpy as np
 import altair as alt
 from io import BytesIO
 
+import cpl
+import exports
+import optimizer as op
+import perf
+
 st.set_page_config(page_title="MSME Targets & Campaign Performance", layout="wide")
+perf.begin_run("targets", trace_memory=st.session_state.get("perf_debug", False))
 
 st.title("MSME – 3‑Month Target CPL & Campaign Performance (OGA / Repeat OGA)")
 st.caption("Built for Yashvardhan Joshi – Option A flow (State × BU × Month Leads & Cost)")
@@ -13,126 +19,10 @@ st.caption("Built for Yashvardhan Joshi – Option A flow (State × BU × Month
 # -----------------------------
 # Helpers
 # -----------------------------
-@st.cache_data(show_spinner=False)
-def read_tabular(file):
-    name = file.name.lower()
-    if name.endswith('.csv'):
-        df = pd.read_csv(file)
-    elif name.endswith('.xlsx') or name.endswith('.xls'):
-        df = pd.read_excel(file, engine='openpyxl')
-    else:
-        raise ValueError("Please upload a CSV or XLSX file.")
-    # Trim headers
-    df.columns = [str(c).strip() for c in df.columns]
-    return df
-
-@st.cache_data(show_spinner=False)
-def compute_targets(df_option_a, use_weighted=False):
-    # Expect columns: State | Business Unit | Month (YYYY-MM or date) | Leads | Marketing Cost
-    req = ['State', 'Business Unit', 'Month', 'Leads', 'Marketing Cost']
-    missing = [c for c in req if c not in df_option_a.columns]
-    if missing:
-        raise ValueError(f"Missing required columns in Option A file: {missing}")
-
-    df = df_option_a.copy()
-    # Clean
-    df['State'] = df['State'].astype(str).str.strip()
-    df['Business Unit'] = df['Business Unit'].astype(str).str.strip()
-    # Parse Month
-    # Accept YYYY-MM, YYYY/MM, or full date; coerce to month period
-    def to_period(x):
-        x = str(x).strip()
-        # Try common formats
-        for fmt in ("%Y-%m", "%Y/%m", "%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%m/%d/%Y"):
-            try:
-                return pd.to_datetime(x, format=fmt).to_period('M')
-            except Exception:
-                pass
-        # Fallback to pandas parser
-        try:
-            return pd.to_datetime(x, dayfirst=True).to_period('M')
-        except Exception:
-            return pd.NaT
-    df['Month_Period'] = df['Month'].apply(to_period)
-    df = df.dropna(subset=['Month_Period']).copy()
-
-    # Numerics
-    df['Leads'] = pd.to_numeric(df['Leads'], errors='coerce')
-    df['Marketing Cost'] = pd.to_numeric(df['Marketing Cost'], errors='coerce')
-    df = df.replace([np.inf, -np.inf], np.nan)
-
-    # Compute monthly CPL
-    df['CPL'] = df['Marketing Cost'] / df['Leads']
-
-    # For each State × BU, take latest 3 distinct months present
-    results = []
-    for (state, bu), grp in df.groupby(['State', 'Business Unit']):
-        grp = grp.dropna(subset=['CPL', 'Month_Period'])
-        if grp.empty:
-            continue
-        # Order by month asc to slice last 3
-        grp = grp.sort_values('Month_Period')
-        # Take last 3 months present
-        months = grp['Month_Period'].drop_duplicates().sort_values().to_list()
-        last3 = months[-3:]
-        grp3 = grp[grp['Month_Period'].isin(last3)].copy()
-        if grp3.empty:
-            continue
-        if use_weighted:
-            # Weighted by Leads
-            w = grp3['Leads'].fillna(0)
-            # Avoid divide-by-zero: if sum(w)==0, fallback to simple mean
-            if w.sum() > 0:
-                target = np.average(grp3['CPL'].fillna(0), weights=w)
-            else:
-                target = grp3['CPL'].mean()
-        else:
-            target = grp3['CPL'].mean()
-        results.append({'State': state, 'Business Unit': bu, 'Target_CPL': round(float(target), 2), 'Months_Used': ', '.join([str(p) for p in last3])})
-
-    targets = pd.DataFrame(results)
-    return targets
-
-@st.cache_data(show_spinner=False)
-def aggregate_campaigns(df_enriched, start_date=None, end_date=None, states=None, bu=None):
-    # Expect columns in enriched: Account SF Id, Created Date, Auto state, utm_source, utm_campaign, utm_medium,
-    # Account Record Type, Business Unit, Registered, Opportunity Count, Success Opportunity Count, OGA_Flag, ROGA_Flag
-    req = ['Account SF Id','Created Date','Auto state','Business Unit','utm_source','utm_campaign','utm_medium','Registered','OGA_Flag','ROGA_Flag']
-    missing = [c for c in req if c not in df_enriched.columns]
-    if missing:
-        raise ValueError(f"Missing required columns in enriched file: {missing}")
-
-    df = df_enriched.copy()
-    # Parse dates
-    df['Created Date Parsed'] = pd.to_datetime(df['Created Date'], errors='coerce', dayfirst=True)
-
-    # Filters
-    if start_date is not None:
-        df = df[df['Created Date Parsed'] >= pd.to_datetime(start_date)]
-    if end_date is not None:
-        df = df[df['Created Date Parsed'] <= pd.to_datetime(end_date)]
-    if states:
-        df = df[df['Auto state'].astype(str).isin(states)]
-    if bu:
-        df = df[df['Business Unit'].astype(str).isin(bu)]
-
-    # Ensure ints
-    for c in ['Registered','OGA_Flag','ROGA_Flag']:
-        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype(int)
-
-    # Aggregate at campaign level
-    group_cols = ['utm_source','utm_medium','utm_campaign','Auto state','Business Unit']
-    agg = df.groupby(group_cols).agg(
-        Accounts=('Account SF Id','nunique'),
-        Registrations=('Registered','sum'),
-        OGA_Accounts=('OGA_Flag','sum'),
-        Repeat_OGA_Accounts=('ROGA_Flag','sum')
-    ).reset_index()
-
-    # Additional rates
-    agg['Registration Rate'] = (agg['Registrations'] / agg['Accounts']).replace([np.inf, -np.inf], np.nan).round(3)
-    agg['Repeat/OGA %'] = (agg['Repeat_OGA_Accounts'] / agg['OGA_Accounts']).replace([np.inf, -np.inf], np.nan).round(3)
-    return agg
+read_tabular = perf.cached("read_tabular", st.cache_data(show_spinner=False))(cpl.read_tabular)
+compute_targets = perf.cached("compute_targets", st.cache_data(show_spinner=False))(cpl.compute_targets)
+aggregate_campaigns = perf.cached("aggregate_campaigns", st.cache_data(show_spinner=False))(cpl.aggregate_campaigns)
+response_curves = perf.cached("response_curves", st.cache_data(show_spinner=False))(cpl.response_curves)
 
 # -----------------------------
 # Sidebar – Inputs
@@ -155,6 +45,8 @@ end_date = st.sidebar.date_input("End date", value=None)
 # Placeholder for dynamic filters after file load
 state_filter = None
 bu_filter = None
+targets = pd.DataFrame()
+report, report_keys = {}, {}   # sheets for the combined XLSX/zip report, and what each depends on
 
 # -----------------------------
 # Main – Targets
@@ -176,20 +68,22 @@ with col1:
         if not targets.empty:
             st.success(f"Computed targets for {targets.shape[0]} State × BU pairs.")
             # Show chart
-            top_states = targets.sort_values('Target_CPL', ascending=False).head(20)
-            chart = alt.Chart(top_states).mark_bar().encode(
-                x=alt.X('Target_CPL:Q', title='Target CPL'),
-                y=alt.Y('State:N', sort='-x'),
-                color='Business Unit:N',
-                tooltip=['State','Business Unit','Target_CPL','Months_Used']
-            ).properties(height=420)
-            st.altair_chart(chart, use_container_width=True)
+            with perf.span("targets.plot"):
+                top_states = targets.sort_values('Target_CPL', ascending=False).head(20)
+                chart = alt.Chart(top_states).mark_bar().encode(
+                    x=alt.X('Target_CPL:Q', title='Target CPL'),
+                    y=alt.Y('State:N', sort='-x'),
+                    color='Business Unit:N',
+                    tooltip=['State','Business Unit','Target_CPL','Months_Used']
+                ).properties(height=420)
+                st.altair_chart(chart, use_container_width=True)
 
             st.dataframe(targets.sort_values(['Business Unit','State']).reset_index(drop=True))
 
             # Download
-            csv = targets.to_csv(index=False).encode('utf-8')
-            st.download_button("Download Target_CPL_Statewise.csv", data=csv, file_name="Target_CPL_Statewise.csv", mime="text/csv")
+            targets_sig = exports.signature(exports.source_key(opt_a_file), use_weighted)
+            exports.render(st, "targets", "Target_CPL_Statewise", targets_sig, {"Target CPL": targets})
+            report['Target CPL'], report_keys['Target CPL'] = targets, targets_sig
         else:
             st.warning("No targets computed. Check your columns and data.")
 
@@ -208,6 +102,54 @@ with col2:
     csv_bytes = tmpl.to_csv(index=False).encode('utf-8')
     st.download_button("Download OptionA_Template.csv", data=csv_bytes, file_name="OptionA_Template.csv", mime="text/csv")
 
+# -----------------------------
+# Main – Budget Reallocation
+# -----------------------------
+if not targets.empty:
+    st.header("Budget Reallocation (State × BU)")
+    st.caption("Leads = a·Cost^b fitted per State × BU on the Option A months (b < 1, diminishing returns). "
+               "Spend moves to the pairs with the cheapest next lead, without pushing any pair's CPL above its Target CPL.")
+    curves = response_curves(df_opt_a, targets)
+
+    if curves.empty:
+        st.info("Need Option A months with both Marketing Cost and Leads above 0 to fit response curves.")
+    else:
+        r1, r2, r3 = st.columns(3)
+        max_shift = r1.slider("Max change per State × BU (±%)", 10, 100, 50, step=10) / 100
+        use_cap = r2.checkbox("Cap at Target CPL", value=True)
+        target = curves['Target_CPL'].to_numpy() if use_cap else None
+        lo, hi = op.bounds(curves, max_shift, target)
+        now_total = float(curves['spend_now'].sum())
+        budget = r3.number_input("Monthly budget", min_value=float(lo.sum()), max_value=float(hi.sum()),
+                                 value=float(np.clip(now_total, lo.sum(), hi.sum())), step=max(1.0, round(now_total / 100, -2)))
+
+        with perf.span("realloc.solve"):
+            alloc = op.plan(curves, budget, max_shift, target)
+            report['Budget plan'], report_keys['Budget plan'] = alloc, exports.frame_key(alloc)
+        with perf.span("realloc.frontier") as sp:
+            fr = op.frontier(curves, np.linspace(lo.sum(), hi.sum(), 2000), max_shift, target)
+            sp['rows'] = len(fr)
+
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Forecast leads at current cost", f"{alloc['leads_now_fc'].sum():,.0f}", help=f"{now_total:,.0f} / month (avg of last 3 months)")
+        m2.metric("Forecast leads reallocated", f"{alloc['leads_opt_fc'].sum():,.0f}",
+                  delta=f"{alloc['leads_opt_fc'].sum() - alloc['leads_now_fc'].sum():,.0f}")
+        m3.metric("Blended CPL", f"{alloc['spend_opt'].sum() / max(alloc['leads_opt_fc'].sum(), 1e-9):,.2f}")
+
+        with perf.span("realloc.plot"):
+            fr_long = fr.melt(id_vars=['spent'], value_vars=['optimal', 'current_mix'], var_name='Mix', value_name='Leads')
+            line = alt.Chart(fr_long).mark_line().encode(
+                x=alt.X('spent:Q', title='Monthly budget'),
+                y=alt.Y('Leads:Q', title='Forecast leads'),
+                color='Mix:N'
+            )
+            rule = alt.Chart(pd.DataFrame({'spent': [budget]})).mark_rule(strokeDash=[4, 4]).encode(x='spent:Q')
+            st.altair_chart((line + rule).properties(height=320), use_container_width=True)
+
+        show = ['State', 'Business Unit', 'spend_now', 'spend_opt', 'spend_change', 'leads_now_fc', 'leads_opt_fc',
+                'cpl_opt', 'Target_CPL', 'b', 'n_points']
+        st.dataframe(alloc.sort_values('spend_change', ascending=False)[show].round(2).reset_index(drop=True))
+
 # -----------------------------
 # Main – Campaign Aggregation
 # -----------------------------
@@ -237,12 +179,32 @@ else:
         k3.metric("OGA Accounts", f"{int(agg['OGA_Accounts'].sum()):,}")
         k4.metric("Repeat OGA Accounts", f"{int(agg['Repeat_OGA_Accounts'].sum()):,}")
 
-        st.dataframe(agg.sort_values(['Repeat_OGA_Accounts','OGA_Accounts','Registrations','Accounts'], ascending=False).reset_index(drop=True))
+        with perf.span("campaigns.table", rows=len(agg)):
+            st.dataframe(agg.sort_values(['Repeat_OGA_Accounts','OGA_Accounts','Registrations','Accounts'], ascending=False).reset_index(drop=True))
         # Download
-        csv2 = agg.to_csv(index=False).encode('utf-8')
-        st.download_button("Download Campaign_Aggregation.csv", data=csv2, file_name="Campaign_Aggregation.csv", mime="text/csv")
+        campaigns_sig = exports.signature(exports.source_key(enriched_file), start_date, end_date, sel_states, sel_bu)
+        exports.render(st, "campaigns", "Campaign_Aggregation", campaigns_sig, {"Campaigns": agg})
+        report['Campaigns'], report_keys['Campaigns'] = agg, campaigns_sig
     else:
         st.warning("No rows after filters. Try broadening the filters.")
 
 st.divider()
 st.caption("Notes: Target CPL uses the average of the latest 3 months present in the Option A file (per State × BU). If 'Weighted by Leads' is selected, months are weighted by their lead volumes.")
+
+# -----------------------------
+# Export – combined report
+# -----------------------------
+if report:
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Export report")
+    exports.render(st.sidebar, "report", "MSME_Targets_Report", exports.signature(report_keys), report,
+                   label="Report", formats=["Excel (XLSX)", "CSV", "CSV (gzip)"])
+
+# -----------------------------
+# Debug panel
+# -----------------------------
+perf.end_run()
+st.sidebar.markdown("---")
+if st.sidebar.checkbox("Show timing panel", key="perf_debug",
+                       help="Per-rerun span timings, cache hits/misses and peak memory (memory tracing slows reruns)."):
+    perf.render_panel(st.sidebar)
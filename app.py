@@ -1,63 +1,25 @@
 # app.py — Advanced Analytics Workbench (JSW One Platforms | MSME)
 import streamlit as st
-import pandas as pd
 import numpy as np
 from pathlib import Path
 
 import plotly.express as px
 import plotly.graph_objects as go
 
-import statsmodels.api as sm
 from statsmodels.stats.proportion import proportions_ztest
-from statsmodels.stats.outliers_influence import variance_inflation_factor
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from scipy.stats import zscore
+
+import analytics as an
+import exports
+import optimizer as op
+import perf
+from consolidate import TARGET_CPL
 
 st.set_page_config(page_title="JSW One Platforms | MSME Analytics", layout="wide")
+perf.begin_run("app", trace_memory=st.session_state.get("perf_debug", False))
 
 # ----------------------- Data utilities -----------------------
-@st.cache_data(show_spinner=False)
-def load_df(src):
-    if hasattr(src, "read"):  # uploaded file
-        df = pd.read_csv(src)
-    else:
-        df = pd.read_csv(src)
-
-    # Schema coercion
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    for c in ['impressions','clicks','page_visits','leads','registrations',
-              'opportunities','orders','spend','target_cpl']:
-        if c not in df.columns:
-            df[c] = 0
-        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-
-    for c, default in [('market','All Markets'),('segment','—'),('source','Unknown'),('campaign','Unknown')]:
-        if c not in df.columns: df[c] = default
-        df[c] = df[c].fillna(default)
-
-    # Derived metrics
-    df['reg_rate']   = df['registrations'] / df['leads'].replace(0, np.nan)
-    df['opp_rate']   = df['opportunities'] / df['leads'].replace(0, np.nan)
-    df['order_rate'] = df['orders'] / df['leads'].replace(0, np.nan)
-    df['cpl'] = df['spend'] / df['leads'].replace(0, np.nan)
-    return df
-
-def ci_normal(p, n, z=1.96):
-    """Normal approx CI for a proportion."""
-    if n <= 0 or pd.isna(p): return (np.nan, np.nan)
-    se = np.sqrt(p*(1-p)/n)
-    return (p - z*se, p + z*se)
-
-def add_ci_rates(g):
-    out = []
-    for _, r in g.iterrows():
-        rr_l, rr_u = ci_normal(r['reg_rate'], r['leads'])
-        or_l, or_u = ci_normal(r['order_rate'], r['leads'])
-        out.append((rr_l, rr_u, or_l, or_u))
-    g[['reg_ci_lo','reg_ci_hi','ord_ci_lo','ord_ci_hi']] = pd.DataFrame(out, index=g.index)
-    return g
-
-def ensure_nonneg(s): return s.fillna(0).clip(lower=0)
+load_df = perf.cached("load_df", st.cache_data(show_spinner=False))(an.load_df)
+load_cohorts = perf.cached("load_cohorts", st.cache_data(show_spinner=False))(an.load_cohorts)
 
 # ----------------------- Data Ingestion -----------------------
 st.sidebar.title("Data")
@@ -81,6 +43,16 @@ else:
     )
     st.stop()
 
+# Cohort table (lead month × months since lead) written by consolidate.py
+cohort_upload = st.sidebar.file_uploader("Upload cohort CSV (optional)", type=["csv"])
+DEFAULT_COHORTS_CSV = "campaign_cohorts.csv"
+if cohort_upload:
+    cohorts = load_cohorts(cohort_upload)
+elif not uploaded and Path(DEFAULT_COHORTS_CSV).exists():
+    cohorts = load_cohorts(DEFAULT_COHORTS_CSV)
+else:
+    cohorts = None
+
 # ----------------------- Global Filters -----------------------
 st.sidebar.title("Filters")
 months   = st.sidebar.multiselect("Month", sorted(df['date'].dt.to_period('M').astype(str).unique().tolist()))
@@ -89,12 +61,9 @@ segments = st.sidebar.multiselect("Segment (Industry)", sorted(df['segment'].dro
 sources  = st.sidebar.multiselect("Source (Channel)", sorted(df['source'].dropna().unique().tolist()))
 campaigns= st.sidebar.multiselect("Campaign", sorted(df['campaign'].dropna().unique().tolist()))
 
-f = df.copy()
-if months:   f = f[f['date'].dt.to_period('M').astype(str).isin(months)]
-if markets:  f = f[f['market'].isin(markets)]
-if segments: f = f[f['segment'].isin(segments)]
-if sources:  f = f[f['source'].isin(sources)]
-if campaigns:f = f[f['campaign'].isin(campaigns)]
+with perf.span("filter") as sp:
+    f = an.apply_filters(df, months, markets, segments, sources, campaigns)
+    sp['rows'] = len(f)
 
 st.sidebar.caption(f"Rows: {len(f):,}")
 
@@ -112,197 +81,205 @@ kpi5.metric("Spend (₹)", f"₹{float(f['spend'].sum()):,.0f}")
 st.divider()
 
 # ----------------------- Tabs -----------------------
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "Overview", "Diagnostics", "Cohorts", "Drivers (Model)", "Forecast", "A/B Test"
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
+    "Overview", "Diagnostics", "Cohorts", "Drivers (Model)", "Forecast", "A/B Test", "Budget Optimizer"
 ])
 
+report = {}   # tables shown in the tabs, exported together from the sidebar
+
 # ======================= TAB 1: OVERVIEW =======================
-with tab1:
+with tab1, perf.span("tab.overview"):
     colA, colB = st.columns([1,1])
     with colA:
         st.subheader("Funnel (Leads → Registrations → Opportunities → Orders)")
         # Pure conversion funnel, no Impressions
-        fun_vals = [
-            ensure_nonneg(f['leads']).sum(),
-            ensure_nonneg(f['registrations']).sum(),
-            ensure_nonneg(f['opportunities']).sum(),
-            ensure_nonneg(f['orders']).sum()
-        ]
-        fun_labels = ["Leads","Registrations","Opportunities","Orders"]
-        fig_funnel = go.Figure(go.Funnel(
-            y=fun_labels,
-            x=fun_vals,
-            textinfo="value+percent initial",
-            marker={"color":["#6FA8DC","#3D85C6","#134F5C","#0C343D"]}
-        ))
-        st.plotly_chart(fig_funnel, use_container_width=True)
+        with perf.span("overview.funnel"):
+            fun_vals = an.funnel_values(f)
+            fun_labels = ["Leads","Registrations","Opportunities","Orders"]
+            fig_funnel = go.Figure(go.Funnel(
+                y=fun_labels,
+                x=fun_vals,
+                textinfo="value+percent initial",
+                marker={"color":["#6FA8DC","#3D85C6","#134F5C","#0C343D"]}
+            ))
+            st.plotly_chart(fig_funnel, use_container_width=True)
 
     with colB:
         st.subheader("Channel Mix & Conversion")
-        mix = (f.groupby('source', as_index=False)
-                 [['leads','registrations','orders','spend']]
-                 .sum()
-                 .assign(reg_rate=lambda d: d['registrations']/d['leads'].replace(0,np.nan),
-                         order_rate=lambda d: d['orders']/d['leads'].replace(0,np.nan)))
-        # add CI
-        mix = add_ci_rates(mix)
-        fig_mix = px.bar(mix, x='source', y=['leads','registrations','orders'],
-                         barmode='group', title="Volume by Source")
-        fig_mix.update_layout(legend_title_text="")
-        st.plotly_chart(fig_mix, use_container_width=True)
-
-        # Conversion scatter with CI
-        fig_conv = go.Figure()
-        fig_conv.add_trace(go.Scatter(
-            x=mix['source'], y=mix['reg_rate'], mode='markers+lines', name='Reg Rate',
-            line=dict(color="#3D85C6"), marker=dict(size=9)
-        ))
-        fig_conv.add_trace(go.Scatter(
-            x=mix['source'], y=mix['reg_ci_lo'], mode='lines', line=dict(width=0, color='rgba(0,0,0,0)'),
-            showlegend=False
-        ))
-        fig_conv.add_trace(go.Scatter(
-            x=mix['source'], y=mix['reg_ci_hi'], mode='lines', line=dict(width=0, color='rgba(0,0,0,0)'),
-            fill='tonexty', fillcolor='rgba(61,133,198,0.2)', name='Reg CI'
-        ))
-        fig_conv.update_layout(title="Registration Rate by Source (with CI)", yaxis_tickformat=".1%")
-        st.plotly_chart(fig_conv, use_container_width=True)
+        with perf.span("overview.mix.agg"):
+            mix = an.channel_mix(f)
+            report['Channel mix'] = mix
+        with perf.span("overview.mix.plot"):
+            fig_mix = px.bar(mix, x='source', y=['leads','registrations','orders'],
+                             barmode='group', title="Volume by Source")
+            fig_mix.update_layout(legend_title_text="")
+            st.plotly_chart(fig_mix, use_container_width=True)
+
+            # Conversion scatter with CI
+            fig_conv = go.Figure()
+            fig_conv.add_trace(go.Scatter(
+                x=mix['source'], y=mix['reg_rate'], mode='markers+lines', name='Reg Rate',
+                line=dict(color="#3D85C6"), marker=dict(size=9)
+            ))
+            fig_conv.add_trace(go.Scatter(
+                x=mix['source'], y=mix['reg_ci_lo'], mode='lines', line=dict(width=0, color='rgba(0,0,0,0)'),
+                showlegend=False
+            ))
+            fig_conv.add_trace(go.Scatter(
+                x=mix['source'], y=mix['reg_ci_hi'], mode='lines', line=dict(width=0, color='rgba(0,0,0,0)'),
+                fill='tonexty', fillcolor='rgba(61,133,198,0.2)', name='Reg CI'
+            ))
+            fig_conv.update_layout(title="Registration Rate by Source (with CI)", yaxis_tickformat=".1%")
+            st.plotly_chart(fig_conv, use_container_width=True)
 
     st.subheader("Market × Source Matrix — Rates and CPL")
-    pvt = (f.groupby(['market','source'], as_index=False)
-             [['leads','registrations','orders','spend']]
-             .sum())
-    pvt['reg_rate'] = pvt['registrations']/pvt['leads'].replace(0,np.nan)
-    pvt['order_rate'] = pvt['orders']/pvt['leads'].replace(0,np.nan)
-    pvt['cpl'] = pvt['spend']/pvt['leads'].replace(0,np.nan)
+    with perf.span("overview.matrix.agg"):
+        pvt = an.market_source_matrix(f)
+        report['Market x Source'] = pvt
     # Heatmap on reg rate
-    fig_heat = px.density_heatmap(pvt, x='source', y='market', z='reg_rate',
-                                  color_continuous_scale='Blues',
-                                  title="Registration Rate Heatmap (Market × Source)")
-    fig_heat.update_layout(yaxis={'categoryorder':'total ascending'}, coloraxis_colorbar={'title':'Reg Rate'})
-    st.plotly_chart(fig_heat, use_container_width=True)
+    with perf.span("overview.matrix.plot"):
+        fig_heat = px.density_heatmap(pvt, x='source', y='market', z='reg_rate',
+                                      color_continuous_scale='Blues',
+                                      title="Registration Rate Heatmap (Market × Source)")
+        fig_heat.update_layout(yaxis={'categoryorder':'total ascending'}, coloraxis_colorbar={'title':'Reg Rate'})
+        st.plotly_chart(fig_heat, use_container_width=True)
 
 # ==================== TAB 2: DIAGNOSTICS =======================
-with tab2:
+with tab2, perf.span("tab.diagnostics"):
     st.subheader("Anomaly / Outlier Detection (Campaign)")
     # choose a metric to flag
     metric = st.selectbox("Metric for outlier detection", ["reg_rate","order_rate","cpl"])
     # aggregate at campaign
-    cg = (f.groupby('campaign', as_index=False)
-            [['leads','registrations','orders','spend']]
-            .sum())
-    cg['reg_rate'] = cg['registrations']/cg['leads'].replace(0,np.nan)
-    cg['order_rate'] = cg['orders']/cg['leads'].replace(0,np.nan)
-    cg['cpl'] = cg['spend']/cg['leads'].replace(0,np.nan)
-    cg['z'] = zscore(cg[metric].astype(float).replace([np.inf,-np.inf], np.nan), nan_policy='omit')
-    cg['outlier'] = (np.abs(cg['z']) > 2.5)
-
-    fig_sc = px.scatter(cg, x='leads', y=metric, color='outlier',
-                        hover_data=['campaign','registrations','orders','spend'],
-                        title=f"Campaign Scatter — {metric} vs Leads (outliers in red)")
-    st.plotly_chart(fig_sc, use_container_width=True)
+    with perf.span("diagnostics.outliers.agg"):
+        cg = an.campaign_outliers(f, metric)
+        report['Campaigns'] = cg
+
+    with perf.span("diagnostics.outliers.plot"):
+        fig_sc = px.scatter(cg, x='leads', y=metric, color='outlier',
+                            hover_data=['campaign','registrations','orders','spend'],
+                            title=f"Campaign Scatter — {metric} vs Leads (outliers in red)")
+        st.plotly_chart(fig_sc, use_container_width=True)
 
     st.markdown("**Flagged Outliers (|z| > 2.5):**")
     st.dataframe(cg[cg['outlier']].sort_values('z', ascending=False))
 
     st.subheader("Control Chart — Registration Rate over Time")
-    ts = (f.groupby('date', as_index=False)[['leads','registrations']].sum())
-    ts['reg_rate'] = ts['registrations']/ts['leads'].replace(0,np.nan)
-    mu = ts['reg_rate'].mean()
-    sd = ts['reg_rate'].std()
-    ucl = mu + 3*sd
-    lcl = mu - 3*sd
-    fig_ctl = go.Figure()
-    fig_ctl.add_trace(go.Scatter(x=ts['date'], y=ts['reg_rate'], mode='lines+markers', name='Reg rate', line=dict(color="#3D85C6")))
-    fig_ctl.add_hline(y=mu, line_dash="dot", line_color="gray", annotation_text="Mean", annotation_position="top left")
-    fig_ctl.add_hline(y=ucl, line_dash="dash", line_color="red", annotation_text="UCL(+3σ)")
-    fig_ctl.add_hline(y=lcl, line_dash="dash", line_color="red", annotation_text="LCL(-3σ)")
-    fig_ctl.update_layout(yaxis_tickformat=".1%")
-    st.plotly_chart(fig_ctl, use_container_width=True)
+    with perf.span("diagnostics.control.agg"):
+        ts, mu, ucl, lcl = an.control_series(f)
+    with perf.span("diagnostics.control.plot"):
+        fig_ctl = go.Figure()
+        fig_ctl.add_trace(go.Scatter(x=ts['date'], y=ts['reg_rate'], mode='lines+markers', name='Reg rate', line=dict(color="#3D85C6")))
+        fig_ctl.add_hline(y=mu, line_dash="dot", line_color="gray", annotation_text="Mean", annotation_position="top left")
+        fig_ctl.add_hline(y=ucl, line_dash="dash", line_color="red", annotation_text="UCL(+3σ)")
+        fig_ctl.add_hline(y=lcl, line_dash="dash", line_color="red", annotation_text="LCL(-3σ)")
+        fig_ctl.update_layout(yaxis_tickformat=".1%")
+        st.plotly_chart(fig_ctl, use_container_width=True)
 
     st.subheader("Distributions")
-    colD1, colD2 = st.columns(2)
-    with colD1:
-        fig_cpl = px.histogram(f, x='cpl', nbins=50, title="CPL Distribution", color_discrete_sequence=["#6FA8DC"])
-        st.plotly_chart(fig_cpl, use_container_width=True)
-    with colD2:
-        fig_rr = px.histogram(f, x='reg_rate', nbins=50, title="Registration Rate Distribution", color_discrete_sequence=["#3D85C6"])
-        fig_rr.update_layout(xaxis_tickformat=".1%")
-        st.plotly_chart(fig_rr, use_container_width=True)
+    with perf.span("diagnostics.histograms.plot"):
+        colD1, colD2 = st.columns(2)
+        with colD1:
+            fig_cpl = px.histogram(f, x='cpl', nbins=50, title="CPL Distribution", color_discrete_sequence=["#6FA8DC"])
+            st.plotly_chart(fig_cpl, use_container_width=True)
+        with colD2:
+            fig_rr = px.histogram(f, x='reg_rate', nbins=50, title="Registration Rate Distribution", color_discrete_sequence=["#3D85C6"])
+            fig_rr.update_layout(xaxis_tickformat=".1%")
+            st.plotly_chart(fig_rr, use_container_width=True)
 
 # ====================== TAB 3: COHORTS =========================
-with tab3:
-    st.subheader("Lead Cohorts → Registration Rate")
-    # Cohort by Lead Month and Source (or Market)
+with tab3, perf.span("tab.cohorts"):
     cohort_dim = st.selectbox("Cohort dimension", ["source","market","segment"])
-    f['lead_month'] = f['date'].dt.to_period('M').astype(str)
-    c = (f.groupby(['lead_month', cohort_dim], as_index=False)
-           [['leads','registrations']].sum())
-    c['reg_rate'] = c['registrations']/c['leads'].replace(0,np.nan)
-    fig_cohort = px.line(c, x='lead_month', y='reg_rate', color=cohort_dim, markers=True,
-                         title=f"Registration Rate by Lead Cohort Month × {cohort_dim.title()}")
-    fig_cohort.update_layout(xaxis_title="Lead Month", yaxis_tickformat=".1%")
-    st.plotly_chart(fig_cohort, use_container_width=True)
+    if cohorts is None:
+        st.subheader("Lead Cohorts → Registration Rate")
+        st.info(f"No cohort table loaded — run `python consolidate.py` to build `{DEFAULT_COHORTS_CSV}` "
+                "(or upload one). Showing registration rate by lead month instead.")
+        with perf.span("cohorts.agg"):
+            c = an.cohort_rates(f, cohort_dim)
+        with perf.span("cohorts.plot"):
+            fig_cohort = px.line(c, x='lead_month', y='reg_rate', color=cohort_dim, markers=True,
+                                 title=f"Registration Rate by Lead Cohort Month × {cohort_dim.title()}")
+            fig_cohort.update_layout(xaxis_title="Lead Month", yaxis_tickformat=".1%")
+            st.plotly_chart(fig_cohort, use_container_width=True)
+    else:
+        st.subheader("Lead Cohorts → Cumulative Conversion")
+        cohort_metric = st.selectbox("Conversion", ["registrations","opportunities","orders"])
+        with perf.span("cohorts.agg"):
+            co = an.filter_cohorts(cohorts, months, markets, segments, sources)
+            as_of = cohorts['lead_month'].max()
+            curves = an.cohort_curves(co, cohort_dim, cohort_metric, as_of) if not co.empty else None
+            tri = an.cohort_triangle(co, cohort_metric, as_of) if not co.empty else None
+            if curves is not None:
+                report['Cohort curves'] = curves
+        if curves is None:
+            st.warning("No cohorts match the current filters.")
+        else:
+            with perf.span("cohorts.plot"):
+                fig_cohort = px.line(curves, x='months_since', y='cum_rate', color=cohort_dim, markers=True,
+                                     hover_data=['leads'],
+                                     title=f"Cumulative {cohort_metric.title()} / Leads by Months Since Lead × {cohort_dim.title()}")
+                fig_cohort.update_layout(xaxis_title="Months since lead", yaxis_tickformat=".1%")
+                st.plotly_chart(fig_cohort, use_container_width=True)
+
+                fig_tri = px.imshow(tri, color_continuous_scale='Blues', aspect='auto',
+                                    labels={'x':'Months since lead','y':'Lead month','color':'Cum. rate'},
+                                    title=f"Cohort Triangle — Cumulative {cohort_metric.title()} Rate")
+                fig_tri.update_layout(coloraxis_colorbar={'tickformat':'.0%'})
+                st.plotly_chart(fig_tri, use_container_width=True)
+        if campaigns:
+            st.caption("Campaign filter not applied here: cohorts are kept at market × segment × source grain.")
 
 # =================== TAB 4: DRIVERS (MODEL) ====================
-with tab4:
+with tab4, perf.span("tab.drivers"):
     st.subheader("What drives Orders / Registrations? (OLS)")
     target = st.selectbox("Target variable", ["orders","registrations"])
     # Build a modelling table (monthly by campaign)
-    Xdf = (f.groupby(['date','market','segment','source','campaign'], as_index=False)
-             [['leads','registrations','opportunities','orders','spend','clicks','impressions']]
-             .sum())
-    # Simple feature set
-    features = ['leads','registrations','opportunities','spend','clicks','impressions']
-    # Avoid perfect leakage: if target=registrations, drop 'registrations' as predictor
-    feat = [x for x in features if x != target]
-    X = Xdf[feat].fillna(0).astype(float)
-    y = Xdf[target].astype(float)
+    with perf.span("drivers.agg"):
+        X, y = an.drivers_table(f, target)
 
     # Add constant and fit
-    Xc = sm.add_constant(X, has_constant='add')
-    model = sm.OLS(y, Xc).fit()
+    with perf.span("drivers.ols"):
+        Xc, model = an.fit_ols(X, y)
     st.write(model.summary())
 
     # VIF for multicollinearity
     st.markdown("**Variance Inflation Factor (VIF)**")
-    vif = pd.DataFrame({
-        "feature": Xc.columns,
-        "VIF": [variance_inflation_factor(Xc.values, i) for i in range(Xc.shape[1])]
-    })
+    with perf.span("drivers.vif"):
+        vif = an.vif_table(Xc)
+        report['VIF'] = vif
     st.dataframe(vif)
 
 # ======================= TAB 5: FORECAST =======================
-with tab5:
+with tab5, perf.span("tab.forecast"):
     st.subheader("Forecast (Holt‑Winters ETS)")
     series_opt = st.selectbox("Metric to forecast", ["orders","registrations","leads"])
-    ts = (f.groupby('date', as_index=False)[[series_opt]].sum()).dropna()
-    ts = ts.sort_values('date')
+    with perf.span("forecast.agg"):
+        ts = an.forecast_series(f, series_opt)
     if len(ts) >= 6:
-        hw = ExponentialSmoothing(ts[series_opt], trend='add', seasonal=None, initialization_method='estimated')
-        res = hw.fit()
+        with perf.span("forecast.model"):
+            res = an.fit_forecast(ts, series_opt)
         horizon = st.slider("Forecast months", 1, 6, 3)
-        fcast = res.forecast(horizon)
-        df_fc = pd.DataFrame({"date": pd.date_range(ts['date'].max()+pd.offsets.MonthBegin(), periods=horizon, freq='MS'),
-                              "forecast": fcast.values})
-        fig_fc = go.Figure()
-        fig_fc.add_trace(go.Scatter(x=ts['date'], y=ts[series_opt], mode='lines+markers', name='Actual'))
-        fig_fc.add_trace(go.Scatter(x=df_fc['date'], y=df_fc['forecast'], mode='lines+markers', name='Forecast'))
-        fig_fc.update_layout(title=f"{series_opt.title()} — Actual vs Forecast")
-        st.plotly_chart(fig_fc, use_container_width=True)
+        df_fc = an.forecast_frame(ts, res, horizon)
+        report['Forecast'] = df_fc
+        with perf.span("forecast.plot"):
+            fig_fc = go.Figure()
+            fig_fc.add_trace(go.Scatter(x=ts['date'], y=ts[series_opt], mode='lines+markers', name='Actual'))
+            fig_fc.add_trace(go.Scatter(x=df_fc['date'], y=df_fc['forecast'], mode='lines+markers', name='Forecast'))
+            fig_fc.update_layout(title=f"{series_opt.title()} — Actual vs Forecast")
+            st.plotly_chart(fig_fc, use_container_width=True)
         st.write("Forecast values:", df_fc)
     else:
         st.info("Need at least 6 time points to forecast.")
 
 # ======================= TAB 6: A/B TEST ======================
-with tab6:
+with tab6, perf.span("tab.abtest"):
     st.subheader("A/B Significance Test (2‑Proportion Z‑test)")
     st.caption("Choose two groups and compare conversion rate: Registrations / Leads.")
 
     # group dimension
     dim = st.selectbox("Group by", ["source","campaign","market","segment"])
-    grp = (f.groupby(dim, as_index=False)[['leads','registrations']].sum())
-    choices = grp[dim].tolist()
+    with perf.span("abtest.agg"):
+        grp = an.ab_groups(f, dim)
+        choices = grp[dim].tolist()
 
     colA, colB = st.columns(2)
     with colA:
@@ -315,7 +292,8 @@ with tab6:
     count = np.array([a_row['registrations'], b_row['registrations']])
     nobs  = np.array([a_row['leads'],         b_row['leads']])
     if (nobs > 0).all():
-        stat, pval = proportions_ztest(count, nobs, alternative='two-sided')
+        with perf.span("abtest.ztest"):
+            stat, pval = proportions_ztest(count, nobs, alternative='two-sided')
         st.write(f"**A/B Result** — z = {stat:.2f}, p = {pval:.4f}")
         st.write(f"{A} Reg‑Rate = {a_row['registrations']/max(1,a_row['leads']):.2%} | "
                  f"{B} Reg‑Rate = {b_row['registrations']/max(1,b_row['leads']):.2%}")
@@ -325,3 +303,76 @@ with tab6:
             st.info("No statistically significant difference at α=0.05.")
     else:
         st.warning("One of the groups has zero leads; cannot test.")
+
+# ======================= TAB 7: BUDGET OPTIMIZER ======================
+with tab7, perf.span("tab.optimizer"):
+    st.subheader("Budget Reallocation (Market × Source)")
+    st.caption("Response curve per market × source: leads = a·spend^b fitted on monthly history (b < 1, diminishing returns). "
+               "Current spend = average of the last 3 months per unit.")
+    with perf.span("optimizer.fit") as sp:
+        curves = an.response_curves(f, fallback_cpl=TARGET_CPL)   # for files that summed target_cpl
+        sp['rows'] = len(curves)
+
+    if curves.empty:
+        st.info("Need months with both spend and leads to fit response curves.")
+    else:
+        c1, c2, c3 = st.columns(3)
+        objective = c1.selectbox("Maximise", ["leads","registrations"])
+        max_shift = c2.slider("Max change per unit (±%)", 10, 100, 50, step=10) / 100
+        has_targets = bool(curves['target_cpl'].notna().any())
+        use_cap = c3.checkbox("Cap at target CPL", value=has_targets, disabled=not has_targets,
+                              help="Keep each unit's forecast CPL at or below its target_cpl: the smallest value in the data "
+                                   "for that market × source, or the per-source target for files that summed it.")
+        target = curves['target_cpl'].to_numpy() if use_cap else None
+        scale = curves['reg_per_lead'].to_numpy() if objective == "registrations" else None
+
+        lo, hi = op.bounds(curves, max_shift, target)
+        now_total = float(curves['spend_now'].sum())
+        budget = st.number_input("Monthly budget (₹)", min_value=float(lo.sum()), max_value=float(hi.sum()),
+                                 value=float(np.clip(now_total, lo.sum(), hi.sum())), step=max(1.0, round(now_total / 100, -2)),
+                                 help="Range allowed by the ±change limit and CPL caps.")
+        if now_total > hi.sum():
+            st.caption(f"Current spend ₹{now_total:,.0f} is above what the CPL caps allow; the budget tops out at ₹{hi.sum():,.0f}.")
+
+        with perf.span("optimizer.solve"):
+            alloc = op.plan(curves, budget, max_shift, target, scale)
+            report['Budget plan'] = alloc
+        with perf.span("optimizer.frontier") as sp:
+            fr = op.frontier(curves, np.linspace(lo.sum(), hi.sum(), 2000), max_shift, target, scale)
+            sp['rows'] = len(fr)
+
+        k1, k2, k3 = st.columns(3)
+        k1.metric(f"Forecast {objective} at current spend", f"{alloc['objective_now'].sum():,.0f}", help=f"₹{now_total:,.0f}")
+        k2.metric(f"Forecast {objective} optimised", f"{alloc['objective_opt'].sum():,.0f}",
+                  delta=f"{alloc['objective_opt'].sum() - alloc['objective_now'].sum():,.0f}")
+        k3.metric("Optimised CPL", f"₹{alloc['spend_opt'].sum() / max(alloc['leads_opt_fc'].sum(), 1e-9):,.0f}")
+
+        with perf.span("optimizer.plot"):
+            fig_fr = go.Figure()
+            fig_fr.add_trace(go.Scatter(x=fr['spent'], y=fr['optimal'], mode='lines', name='Optimised mix'))
+            fig_fr.add_trace(go.Scatter(x=fr['spent'], y=fr['current_mix'], mode='lines', name='Current mix (scaled)'))
+            fig_fr.add_vline(x=budget, line_dash='dash')
+            fig_fr.update_layout(title=f"Forecast {objective} vs monthly budget", xaxis_title="Spend (₹)", yaxis_title=objective)
+            st.plotly_chart(fig_fr, use_container_width=True)
+
+        show = ['market','source','spend_now','spend_opt','spend_change','leads_now_fc','leads_opt_fc',
+                'cpl_opt','target_cpl','b','n_points']
+        st.dataframe(alloc.sort_values('spend_change', ascending=False)[show].round(2), hide_index=True)
+        st.caption("b = elasticity (% leads per % spend). Units with under 3 months of history use the pooled b.")
+
+# ----------------------- Export -----------------------
+st.sidebar.title("Export")
+data_key = exports.source_key(uploaded or (DEFAULT_CSV if Path(DEFAULT_CSV).exists() else DEFAULT_CSV_URL))
+filters_sig = exports.signature(data_key, months, markets, segments, sources, campaigns)
+exports.render(st.sidebar, "rows", "Campaign_Data_Filtered", filters_sig, {"Filtered rows": f}, label="Filtered rows")
+# summary tables are small: key them by content so every tab option is covered
+exports.render(st.sidebar, "report", "MSME_Analytics_Report",
+               exports.signature(filters_sig, {k: exports.frame_key(v) for k, v in report.items()}),
+               report, label="Report tables")
+
+# ----------------------- Debug panel -----------------------
+perf.end_run()
+st.sidebar.title("Debug")
+if st.sidebar.checkbox("Show timing panel", key="perf_debug",
+                       help="Per-rerun span timings, cache hits/misses and peak memory (memory tracing slows reruns)."):
+    perf.render_panel(st.sidebar)
@@ -0,0 +1,308 @@
+# bench.py — benchmark suite for the consolidation and dashboard pipelines
+"""
+Times and memory-profiles the hot paths on synthetic data (synthetic.py):
+consolidate.py stages (including the Facebook xlsx read and the end-to-end
+main() on a temporary data dir), load_df, the filter path, each app.py tab's
+computations (including the budget optimizer's fit and 2000-budget frontier),
+compute_targets, aggregate_campaigns, the State × BU curve fit and the report
+export formats (against the old in-memory to_csv download). Case names match the
+perf spans the apps record, so bench numbers and the timing panel line up.
+
+Each case runs --repeat times for wall time (memory tracing off), then once more
+under tracemalloc for peak memory. Results are written as JSON to
+bench_results/<timestamp>_<commit>.json; compare two runs with --compare.
+
+Cases marked slow (row-wise .apply in consolidate.py, XLSX read and write) are timed once instead of
+--repeat times, and skipped above 100k rows unless --all is given. The cohorts
+setup also checks that the incremental cohort update (from last month's file)
+matches a full rebuild.
+
+Run:
+  python bench.py                             # 10k and 100k tiers
+  python bench.py --tiers 1m,10m --repeat 1
+  python bench.py --cases 'overview.*,load_df'
+  python bench.py --compare bench_results/a.json bench_results/b.json
+"""
+import argparse, fnmatch, json, os, platform, subprocess, sys, tempfile, time
+from pathlib import Path
+
+os.environ.setdefault("PERF_LOG_LEVEL", "WARNING")   # keep per-span log lines off the console
+
+import numpy as np, pandas as pd
+
+import analytics as an
+import consolidate
+import cpl
+import exports
+import optimizer as op
+import perf
+import synthetic
+
+RESULTS_DIR = Path('bench_results')
+SLOW_MAX_ROWS = 100_000
+
+
+def _need(ctx, name, fn):
+    """Output of an earlier case, or recompute it when that case was filtered out."""
+    return ctx[name] if name in ctx else fn()
+
+
+# ---------- cases ----------
+# A group is (setup, cases). setup(n, tmp) builds the synthetic inputs into a
+# context dict and only runs when at least one of the group's cases is selected.
+# Cases are (name, fn(ctx), slow); the runner stores each case's return value in
+# ctx under its name, so later cases can build on earlier ones.
+
+def consolidate_setup(n, tmp):
+    ctx = {'g': synthetic.google_ads(n), 'fb': synthetic.facebook_ads(n), 'sf': synthetic.salesforce_master(n),
+           'g_path': tmp / 'MSME_Google Data - Sheet2.csv', 'sf_path': tmp / 'MSME Master Data.csv'}
+    ctx['g'].to_csv(ctx['g_path'], index=False)
+    ctx['sf'].to_csv(ctx['sf_path'], index=False)
+    return ctx
+
+def _frames(c):
+    return [_need(c, 'consolidate.prep_google', lambda: consolidate.prep_google(c['g'])),
+            _need(c, 'consolidate.prep_facebook', lambda: consolidate.prep_facebook(c['fb'])),
+            _need(c, 'consolidate.prep_salesforce', lambda: consolidate.prep_salesforce(c['sf']))]
+
+CONSOLIDATE = [
+    ('consolidate.read_google', lambda c: consolidate.read_google(c['g_path']), False),
+    ('consolidate.read_salesforce', lambda c: consolidate.read_salesforce(c['sf_path']), False),
+    ('consolidate.prep_google', lambda c: consolidate.prep_google(c['g']), True),
+    ('consolidate.prep_facebook', lambda c: consolidate.prep_facebook(c['fb']), True),
+    ('consolidate.prep_salesforce', lambda c: consolidate.prep_salesforce(c['sf']), True),
+    ('consolidate.combine', lambda c: consolidate.combine(_frames(c)), True),
+]
+
+
+def consolidate_files_setup(n, tmp):
+    """The three source files in a data_dir, named as consolidate.main expects."""
+    data_dir = tmp / 'data'
+    data_dir.mkdir(exist_ok=True)
+    synthetic.google_ads(n).to_csv(data_dir / 'MSME_Google Data - Sheet2.csv', index=False)
+    synthetic.write_facebook(data_dir / 'MSME_FB_Data.xlsx', n)
+    synthetic.salesforce_master(n).to_csv(data_dir / 'MSME Master Data.csv', index=False)
+    return {'data_dir': data_dir, 'fb_path': data_dir / 'MSME_FB_Data.xlsx'}
+
+CONSOLIDATE_FILES = [
+    ('consolidate.read_facebook', lambda c: consolidate.read_facebook(c['fb_path']), True),
+    ('consolidate.main', lambda c: consolidate.main(c['data_dir'], out=c['data_dir'].parent / 'consolidated.csv',
+                                                    out_cohorts=c['data_dir'].parent / 'cohorts.csv', full=True), True),
+]
+
+
+def dashboard_setup(n, tmp):
+    path = tmp / 'campaign_data_consolidated.csv'
+    synthetic.consolidated(n).to_csv(path, index=False)
+    df = an.load_df(path)
+    return {'path': path, 'df': df,
+            'months': sorted(df['date'].dt.to_period('M').astype(str).unique().tolist()),
+            'markets': df['market'].value_counts().index[:3].tolist()}
+
+def _Xy(c):
+    return _need(c, 'drivers.agg', lambda: an.drivers_table(c['df'], 'orders'))
+
+def _frontier(curves, n=2000):
+    lo, hi = op.bounds(curves, 0.5, curves['target_cpl'].to_numpy())
+    return op.frontier(curves, np.linspace(lo.sum(), hi.sum(), n), 0.5, curves['target_cpl'].to_numpy())
+
+DASHBOARD = [
+    ('load_df', lambda c: an.load_df(c['path']), False),
+    ('filter.none', lambda c: an.apply_filters(c['df']), False),
+    ('filter.month_market', lambda c: an.apply_filters(c['df'], c['months'][len(c['months']) // 2:], c['markets']), False),
+    ('overview.funnel', lambda c: an.funnel_values(c['df']), False),
+    ('overview.mix.agg', lambda c: an.channel_mix(c['df']), False),
+    ('overview.matrix.agg', lambda c: an.market_source_matrix(c['df']), False),
+    ('diagnostics.outliers.agg', lambda c: an.campaign_outliers(c['df'], 'reg_rate'), False),
+    ('diagnostics.control.agg', lambda c: an.control_series(c['df']), False),
+    ('cohorts.fallback', lambda c: an.cohort_rates(c['df'], 'source'), False),
+    ('drivers.agg', lambda c: an.drivers_table(c['df'], 'orders'), False),
+    ('drivers.ols', lambda c: an.fit_ols(*_Xy(c)), False),
+    ('drivers.vif', lambda c: an.vif_table(_need(c, 'drivers.ols', lambda: an.fit_ols(*_Xy(c)))[0]), False),
+    ('forecast.agg', lambda c: an.forecast_series(c['df'], 'orders'), False),
+    ('forecast.model', lambda c: an.fit_forecast(_need(c, 'forecast.agg', lambda: an.forecast_series(c['df'], 'orders')), 'orders'), False),
+    ('abtest.agg', lambda c: an.ab_groups(c['df'], 'campaign'), False),
+    ('optimizer.fit', lambda c: an.response_curves(c['df']), False),
+    ('optimizer.frontier', lambda c: _frontier(_need(c, 'optimizer.fit', lambda: an.response_curves(c['df']))), False),
+]
+
+
+def _crm_as_of(crm, month):
+    """CRM rows as an export taken in `month` would have them: no later leads or conversions."""
+    crm = crm[crm['date'] <= month].copy()
+    for col, when in [('registered','reg_date'), ('opportunities','opp_date'), ('orders','order_date')]:
+        later = crm[when] > month
+        crm.loc[later, col] = 0
+        crm.loc[later, when] = pd.NaT
+    return crm
+
+def cohorts_setup(n, tmp):
+    """Cohorts from last month's export as `existing`; checks the incremental update matches --full."""
+    crm = consolidate.crm_rows(synthetic.salesforce_master(n))
+    path = tmp / 'campaign_cohorts.csv'
+    cohorts = consolidate.build_cohorts(crm)
+    cohorts.to_csv(path, index=False)
+    prev = tmp / 'campaign_cohorts_prev.csv'
+    consolidate.build_cohorts(_crm_as_of(crm, crm['date'].max() - pd.DateOffset(months=1))).to_csv(prev, index=False)
+    existing = pd.read_csv(prev)
+    pd.testing.assert_frame_equal(consolidate.update_cohorts(crm, existing), pd.read_csv(path), check_dtype=False)
+    return {'crm': crm, 'existing': existing, 'path': path, 'co': an.load_cohorts(path)}
+
+def _cohorts_tab(co):
+    as_of = co['lead_month'].max()
+    return an.cohort_curves(co, 'source', 'registrations', as_of), an.cohort_triangle(co, 'registrations', as_of)
+
+COHORTS = [
+    ('consolidate.cohorts', lambda c: consolidate.build_cohorts(c['crm']), False),
+    ('consolidate.cohorts.incremental', lambda c: consolidate.update_cohorts(c['crm'], c['existing']), False),
+    ('load_cohorts', lambda c: an.load_cohorts(c['path']), False),
+    ('cohorts.agg', lambda c: _cohorts_tab(c['co']), False),
+]
+
+
+def targets_setup(n, tmp):
+    enr = synthetic.enriched_crm(n)
+    return {'oa': synthetic.option_a(n), 'enr': enr, 'tmp': tmp,
+            'agg': cpl.aggregate_campaigns(enr),   # export input: full campaign aggregation, all states
+            'states': sorted(enr['Auto state'].astype(str).dropna().unique().tolist())[:10]}   # app default
+
+def _export(c, fmt):
+    path = c['tmp'] / f"export{exports.FORMATS[fmt][0]}"
+    with open(path, 'wb') as fh:
+        exports.write({'Campaigns': c['agg']}, fmt, fh)
+    return path.stat().st_size
+
+TARGETS = [
+    ('compute_targets', lambda c: cpl.compute_targets(c['oa']), False),
+    ('compute_targets.weighted', lambda c: cpl.compute_targets(c['oa'], use_weighted=True), False),
+    ('aggregate_campaigns', lambda c: cpl.aggregate_campaigns(c['enr']), False),
+    ('aggregate_campaigns.filtered', lambda c: cpl.aggregate_campaigns(
+        c['enr'], start_date='2024-01-01', end_date='2024-12-31', states=c['states']), False),
+    ('realloc.fit', lambda c: cpl.response_curves(c['oa']), False),
+    ('export.to_csv', lambda c: c['agg'].to_csv(index=False).encode('utf-8'), False),   # pre-exports.py download
+    ('export.csv', lambda c: _export(c, 'CSV'), False),
+    ('export.csv_gz', lambda c: _export(c, 'CSV (gzip)'), False),
+    ('export.parquet', lambda c: _export(c, 'Parquet'), False),
+    ('export.xlsx', lambda c: _export(c, 'Excel (XLSX)'), True),
+]
+
+GROUPS = [(consolidate_setup, CONSOLIDATE), (consolidate_files_setup, CONSOLIDATE_FILES), (dashboard_setup, DASHBOARD), (cohorts_setup, COHORTS),
+          (targets_setup, TARGETS)]
+
+
+# ---------- runner ----------
+def _rows(out):
+    if isinstance(out, tuple):
+        out = out[0]
+    return len(out) if hasattr(out, '__len__') else None
+
+
+def measure(name, fn, repeat, memory=True):
+    """Run fn repeat times (timing) and once under tracemalloc (peak); returns (output, record)."""
+    perf.begin_run('bench')
+    times = []
+    for _ in range(repeat):
+        with perf.span(name) as rec:
+            out = fn()
+        times.append(rec['ms'])
+    peak_kb = None
+    if memory:
+        perf.begin_run('bench', trace_memory=True)
+        with perf.span(name) as rec:
+            fn()
+        peak_kb = rec['peak_kb']
+        perf.begin_run('bench')
+    return out, {'ms_min': min(times), 'ms_median': float(np.median(times)),
+                 'repeat': repeat, 'peak_kb': peak_kb, 'out_rows': _rows(out)}
+
+
+def run(tiers, patterns, repeat, memory, run_all):
+    results = []
+    for tier in tiers:
+        n = synthetic.TIERS[tier]
+        with tempfile.TemporaryDirectory() as tmp:
+            for setup, cases in GROUPS:
+                cases = [case for case in cases if any(fnmatch.fnmatch(case[0], p) for p in patterns)]
+                todo = []
+                for name, fn, slow in cases:
+                    if slow and n > SLOW_MAX_ROWS and not run_all:
+                        results.append({'tier': tier, 'rows': n, 'case': name,
+                                        'skipped': f'slow case above {SLOW_MAX_ROWS:,} rows (use --all)'})
+                        print(f"{tier:>5} {name:<32} skipped")
+                    else:
+                        todo.append((name, fn, slow))
+                if not todo:   # don't build inputs (e.g. the Facebook xlsx) nobody will read
+                    continue
+                t0 = time.perf_counter()
+                ctx = setup(n, Path(tmp))
+                print(f"{tier:>5} {setup.__name__} took {time.perf_counter() - t0:.1f}s")
+                for name, fn, slow in todo:
+                    row = {'tier': tier, 'rows': n, 'case': name}
+                    ctx[name], rec = measure(name, lambda: fn(ctx), 1 if slow else repeat, memory)
+                    results.append({**row, **rec})
+                    peak = f"{rec['peak_kb'] / 1024:9.1f} MB" if rec['peak_kb'] is not None else ''
+                    print(f"{tier:>5} {name:<32} {rec['ms_min']:10.1f} ms {peak}")
+                del ctx
+    return results
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(base_path, new_path):
+    load = lambda p: pd.DataFrame(json.loads(Path(p).read_text())['results'])
+    base, new = load(base_path), load(new_path)
+    cols = ['tier', 'case', 'ms_min', 'peak_kb']
+    base = base[[c for c in cols if c in base.columns]]
+    new = new[[c for c in cols if c in new.columns]]
+    m = base.merge(new, on=['tier', 'case'], how='outer', suffixes=('_base', '_new'))
+    m['time_ratio'] = (m['ms_min_new'] / m['ms_min_base']).round(2)
+    if 'peak_kb_base' in m.columns and 'peak_kb_new' in m.columns:
+        m['mem_ratio'] = (m['peak_kb_new'] / m['peak_kb_base']).round(2)
+    print(m.to_string(index=False))
+    return m
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Benchmark consolidation and dashboard pipelines on synthetic data.")
+    ap.add_argument('--tiers', default='10k,100k', help=f"comma-separated, from {', '.join(synthetic.TIERS)}")
+    ap.add_argument('--cases', default='*', help="comma-separated globs over case names")
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    ap.add_argument('--all', action='store_true', help=f"also run slow cases on tiers above {SLOW_MAX_ROWS:,} rows")
+    ap.add_argument('--out', default=str(RESULTS_DIR))
+    ap.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    tiers = [t.strip() for t in args.tiers.split(',') if t.strip()]
+    unknown = [t for t in tiers if t not in synthetic.TIERS]
+    if unknown:
+        ap.error(f"unknown tiers: {unknown}")
+    meta = metadata()
+    results = run(tiers, [p.strip() for p in args.cases.split(',')], args.repeat, not args.no_memory, args.all)
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{meta['timestamp'].replace(':', '')}_{meta['commit'] or 'nogit'}.json"
+    path.write_text(json.dumps({'meta': meta, 'results': results}, indent=2))
+    print("Wrote", path)
@@ -7,19 +7,35 @@ New logic:
 - Registrations = SUM of Salesforce 'Registered' (1/0)
 - Monthly grain (date -> first day of month)
 - Media adds Impressions/Clicks/Spend; CRM adds Leads/Regs/Opps/Orders
+- Cohorts: campaign_cohorts.csv = lead month × months since lead × market/segment/source,
+  with Leads and the Regs/Opps/Orders that converted in each month after the lead.
+  Conversion months come from the CRM date columns (Registration Date, First
+  Opportunity Date, First Order Date) when the export has them, else the lead month.
+  Conversions later than COHORT_HORIZON months land in the last bucket. On rerun
+  only open cohorts are rebuilt: lead months within COHORT_HORIZON months of the
+  latest lead are rebuilt in full, and older lead months only get their last
+  bucket recomputed. Earlier buckets are kept from the existing file, so run with
+  --full after backfilling old CRM history.
 
 Place your three files in ./data:
   - MSME_Google Data - Sheet2.csv
   - MSME_FB_Data.xlsx
   - MSME Master Data.csv
 
-Run: python consolidate.py
+Run: python consolidate.py [--full]
+
+The stages (read_* / prep_* / combine) are importable on their own so the
+benchmark suite (bench.py) can time them on synthetic data.
 """
 import pandas as pd, numpy as np, re
 from pathlib import Path
 
 DATA_DIR = Path('data')
 OUT = Path('campaign_data_consolidated.csv')
+OUT_COHORTS = Path('campaign_cohorts.csv')
+COHORT_HORIZON = 12   # months since lead tracked per cohort; later conversions land in the last bucket
+COHORT_KEYS = ['lead_month','months_since','market','segment','source']
+TARGET_CPL = {'Google': 250.0, 'Facebook': 200.0, 'MoEngage': 180.0}   # per source; a rate, never summed
 
 STATE_MAP = {
     'MH':'Maharashtra','TN':'Tamil Nadu','KA':'Karnataka','GJ':'Gujarat','DL':'Delhi',
@@ -40,12 +56,13 @@ def month_start(s):
     d = pd.to_datetime(s, errors='coerce')
     return d.to_period('M').to_timestamp() if pd.notna(d) else pd.NaT
 
-frames = []
+MEDIA_COLS = ['date','market','segment','source','campaign','impressions','clicks','page_visits','signups','registrations','opportunities','orders','spend','target_cpl']
 
 # ---------- Google ----------
-g_path = next(DATA_DIR.glob('MSME_Google Data*.csv'), None)
-if g_path:
-    g = pd.read_csv(g_path)
+def read_google(path):
+    return pd.read_csv(path)
+
+def prep_google(g):
     g = g.rename(columns={
         'Campaign Name':'campaign','Advertising Channel':'segment',
         'Clicks':'clicks','Impressions':'impressions',
@@ -60,13 +77,14 @@ if g_path:
     g['registrations'] = 0.0     # CRM only
     g['opportunities'] = 0.0
     g['orders'] = 0.0
-    g['target_cpl'] = 250.0
-    frames.append(g[['date','market','segment','source','campaign','impressions','clicks','page_visits','signups','registrations','opportunities','orders','spend','target_cpl']])
+    g['target_cpl'] = TARGET_CPL['Google']
+    return g[MEDIA_COLS]
 
 # ---------- Facebook ----------
-fb_path = next(DATA_DIR.glob('MSME_FB_Data*.xlsx'), None)
-if fb_path:
-    fb = pd.read_excel(fb_path, sheet_name=0, engine='openpyxl')
+def read_facebook(path):
+    return pd.read_excel(path, sheet_name=0, engine='openpyxl')
+
+def prep_facebook(fb):
     fb = fb.rename(columns={
         'Campaign Name':'campaign','Impressions':'impressions','Link Clicks':'clicks',
         'Amount Spent':'spend','Results':'results','Month':'month'
@@ -82,109 +100,214 @@ if fb_path:
     fb['registrations'] = 0.0
     fb['opportunities'] = 0.0
     fb['orders'] = 0.0
-    fb['target_cpl'] = 200.0
-    frames.append(fb[['date','market','segment','source','campaign','impressions','clicks','page_visits','signups','registrations','opportunities','orders','spend','target_cpl']])
+    fb['target_cpl'] = TARGET_CPL['Facebook']
+    return fb[MEDIA_COLS]
 
 # ---------- Salesforce ----------
-sf_path = next(DATA_DIR.glob('MSME Master Data*.csv'), None)
-if sf_path:
+def read_salesforce(path):
     sf = None
     for enc in ['utf-8','latin1','ISO-8859-1']:
         try:
-            sf = pd.read_csv(sf_path, encoding=enc)
+            sf = pd.read_csv(path, encoding=enc)
             break
         except: continue
-    if sf is not None:
-        sf.columns = [c.strip() for c in sf.columns]
-        # map headers (robust to variants)
-        cmap = {}
-        for c in sf.columns:
-            lc = c.lower()
-            if 'created date' in lc: cmap['created'] = c
-            elif 'auto state' in lc: cmap['state'] = c
-            elif 'utm_source' in lc: cmap['utm_source'] = c
-            elif 'utm_campaign' in lc: cmap['utm_campaign'] = c
-            elif 'account sf id' in lc or ('sf id' in lc and 'account' in lc): cmap['sfid'] = c
-            elif 'account record type' in lc: cmap['rectype'] = c
-            elif lc == 'registered' or ('registered' in lc and 'by' not in lc): cmap['registered'] = c
-            elif 'opportunity count' in lc and 'success' not in lc: cmap['opps'] = c
-            elif 'success opportunity count' in lc: cmap['orders'] = c
-
-        # build CRM frame at row level
-        crm = pd.DataFrame()
-        crm['date'] = pd.to_datetime(sf[cmap.get('created')], errors='coerce', dayfirst=True).dt.to_period('M').dt.to_timestamp()
-        def norm_state(x):
-            if pd.isna(x): return None
-            s = str(x).strip().upper()
-            rev = {'GUJARAT':'Gujarat','GJ':'Gujarat','MAHARASHTRA':'Maharashtra','MH':'Maharashtra',
-                   'KARNATAKA':'Karnataka','KA':'Karnataka','TAMIL NADU':'Tamil Nadu','TAMILNADU':'Tamil Nadu','TN':'Tamil Nadu',
-                   'DELHI':'Delhi','DL':'Delhi','TELANGANA':'Telangana','TL':'Telangana','ANDHRA PRADESH':'Andhra Pradesh','AP':'Andhra Pradesh',
-                   'UTTAR PRADESH':'Uttar Pradesh','UP':'Uttar Pradesh','RAJASTHAN':'Rajasthan','RJ':'Rajasthan','HARYANA':'Haryana','HR':'Haryana',
-                   'ODISHA':'Odisha','ORISSA':'Odisha','OD':'Odisha'}
-            return rev.get(s, s.title())
-        crm['market'] = sf[cmap.get('state')].apply(norm_state) if cmap.get('state') else None
-        crm['segment'] = sf[cmap.get('rectype')] if cmap.get('rectype') else 'CRM'
-        # source & campaign from UTM
-        def map_source(s):
-            s = str(s).lower() if pd.notna(s) else ''
-            if 'google' in s or s == 'gg': return 'Google'
-            if 'meta-fb' in s or s == 'fb' or 'facebook' in s or 'meta' in s: return 'Facebook'
-            if 'meta-ig' in s or 'ig' in s or 'instagram' in s: return 'Instagram'
-            if 'moe' in s or 'moengage' in s: return 'MoEngage'
-            return 'Direct'
-        crm['source'] = sf[cmap.get('utm_source')].apply(map_source) if cmap.get('utm_source') else 'Direct'
-        crm['campaign'] = sf[cmap.get('utm_campaign')] if cmap.get('utm_campaign') else 'CRM'
-
-        # metrics from CRM:
-        crm['sfid'] = sf[cmap.get('sfid')] if cmap.get('sfid') else np.nan
-        crm['registered'] = pd.to_numeric(sf[cmap.get('registered')], errors='coerce').fillna(0) if cmap.get('registered') else 0
-        crm['opportunities'] = pd.to_numeric(sf[cmap.get('opps')], errors='coerce').fillna(0) if cmap.get('opps') else 0
-        crm['orders'] = pd.to_numeric(sf[cmap.get('orders')], errors='coerce').fillna(0) if cmap.get('orders') else 0
-
-        # aggregate to grain with DISTINCT SFID for leads
-        agg_crm = (crm
-                   .groupby(['date','market','segment','source','campaign'], dropna=False)
-                   .agg(leads=('sfid', lambda x: pd.Series(x).dropna().nunique()),
-                        registrations=('registered','sum'),
-                        opportunities=('opportunities','sum'),
-                        orders=('orders','sum'))
-                   .reset_index())
-
-        # fill remaining numeric columns (delivery & spend = 0 for CRM)
-        agg_crm['impressions'] = 0.0
-        agg_crm['clicks'] = 0.0
-        agg_crm['page_visits'] = 0.0
-        agg_crm['signups'] = 0.0  # deprecated; app will use 'leads' column
-        agg_crm['spend'] = 0.0
-        def t_cpl(src):
-            return 200.0 if src == 'Facebook' else 250.0 if src == 'Google' else 180.0 if src == 'MoEngage' else 0.0
-        agg_crm['target_cpl'] = agg_crm['source'].apply(t_cpl)
-
-        frames.append(agg_crm[['date','market','segment','source','campaign',
-                               'impressions','clicks','page_visits','signups',
-                               'registrations','opportunities','orders','spend','target_cpl','leads']])
+    return sf
+
+def crm_rows(sf):
+    """Row-level CRM frame (one row per Salesforce record) with normalised dims."""
+    sf.columns = [c.strip() for c in sf.columns]
+    # map headers (robust to variants); conversion dates first so 'Registered Date' /
+    # 'Opportunity Created Date' don't get picked up as the flag / lead date
+    cmap = {}
+    for c in sf.columns:
+        lc = c.lower()
+        if 'date' in lc and 'regist' in lc: cmap['reg_date'] = c
+        elif 'date' in lc and ('success opportunity' in lc or 'order' in lc): cmap['order_date'] = c
+        elif 'date' in lc and 'opportunity' in lc: cmap['opp_date'] = c
+        elif 'created date' in lc: cmap['created'] = c
+        elif 'auto state' in lc: cmap['state'] = c
+        elif 'utm_source' in lc: cmap['utm_source'] = c
+        elif 'utm_campaign' in lc: cmap['utm_campaign'] = c
+        elif 'account sf id' in lc or ('sf id' in lc and 'account' in lc): cmap['sfid'] = c
+        elif 'account record type' in lc: cmap['rectype'] = c
+        elif lc == 'registered' or ('registered' in lc and 'by' not in lc): cmap['registered'] = c
+        elif 'opportunity count' in lc and 'success' not in lc: cmap['opps'] = c
+        elif 'success opportunity count' in lc: cmap['orders'] = c
+
+    # build CRM frame at row level
+    crm = pd.DataFrame()
+    crm['date'] = pd.to_datetime(sf[cmap.get('created')], errors='coerce', dayfirst=True).dt.to_period('M').dt.to_timestamp()
+    def norm_state(x):
+        if pd.isna(x): return None
+        s = str(x).strip().upper()
+        rev = {'GUJARAT':'Gujarat','GJ':'Gujarat','MAHARASHTRA':'Maharashtra','MH':'Maharashtra',
+               'KARNATAKA':'Karnataka','KA':'Karnataka','TAMIL NADU':'Tamil Nadu','TAMILNADU':'Tamil Nadu','TN':'Tamil Nadu',
+               'DELHI':'Delhi','DL':'Delhi','TELANGANA':'Telangana','TL':'Telangana','ANDHRA PRADESH':'Andhra Pradesh','AP':'Andhra Pradesh',
+               'UTTAR PRADESH':'Uttar Pradesh','UP':'Uttar Pradesh','RAJASTHAN':'Rajasthan','RJ':'Rajasthan','HARYANA':'Haryana','HR':'Haryana',
+               'ODISHA':'Odisha','ORISSA':'Odisha','OD':'Odisha'}
+        return rev.get(s, s.title())
+    crm['market'] = sf[cmap.get('state')].apply(norm_state) if cmap.get('state') else None
+    crm['segment'] = sf[cmap.get('rectype')] if cmap.get('rectype') else 'CRM'
+    # source & campaign from UTM
+    def map_source(s):
+        s = str(s).lower() if pd.notna(s) else ''
+        if 'google' in s or s == 'gg': return 'Google'
+        if 'meta-fb' in s or s == 'fb' or 'facebook' in s or 'meta' in s: return 'Facebook'
+        if 'meta-ig' in s or 'ig' in s or 'instagram' in s: return 'Instagram'
+        if 'moe' in s or 'moengage' in s: return 'MoEngage'
+        return 'Direct'
+    crm['source'] = sf[cmap.get('utm_source')].apply(map_source) if cmap.get('utm_source') else 'Direct'
+    crm['campaign'] = sf[cmap.get('utm_campaign')] if cmap.get('utm_campaign') else 'CRM'
+
+    # metrics from CRM:
+    crm['sfid'] = sf[cmap.get('sfid')] if cmap.get('sfid') else np.nan
+    crm['registered'] = pd.to_numeric(sf[cmap.get('registered')], errors='coerce').fillna(0) if cmap.get('registered') else 0
+    crm['opportunities'] = pd.to_numeric(sf[cmap.get('opps')], errors='coerce').fillna(0) if cmap.get('opps') else 0
+    crm['orders'] = pd.to_numeric(sf[cmap.get('orders')], errors='coerce').fillna(0) if cmap.get('orders') else 0
+    # conversion months (NaT when the export has no such column)
+    for k in ['reg_date','opp_date','order_date']:
+        crm[k] = (pd.to_datetime(sf[cmap[k]], errors='coerce', dayfirst=True).dt.to_period('M').dt.to_timestamp()
+                  if cmap.get(k) else pd.NaT)
+    return crm
+
+def aggregate_crm(crm):
+    # aggregate to grain with DISTINCT SFID for leads
+    agg_crm = (crm
+               .groupby(['date','market','segment','source','campaign'], dropna=False)
+               .agg(leads=('sfid', lambda x: pd.Series(x).dropna().nunique()),
+                    registrations=('registered','sum'),
+                    opportunities=('opportunities','sum'),
+                    orders=('orders','sum'))
+               .reset_index())
+
+    # fill remaining numeric columns (delivery & spend = 0 for CRM)
+    agg_crm['impressions'] = 0.0
+    agg_crm['clicks'] = 0.0
+    agg_crm['page_visits'] = 0.0
+    agg_crm['signups'] = 0.0  # deprecated; app will use 'leads' column
+    agg_crm['spend'] = 0.0
+    agg_crm['target_cpl'] = agg_crm['source'].map(TARGET_CPL).fillna(0.0)
+
+    return agg_crm[['date','market','segment','source','campaign',
+                    'impressions','clicks','page_visits','signups',
+                    'registrations','opportunities','orders','spend','target_cpl','leads']]
+
+def prep_salesforce(sf):
+    return aggregate_crm(crm_rows(sf))
+
+# ---------- cohorts ----------
+def _months(s):
+    """Month numbers (datetime64[M]) of a datetime column; NaT stays NaT."""
+    return s.to_numpy().astype('datetime64[M]')
+
+def _months_between(start, end):
+    return pd.Series((_months(end) - _months(start)).astype(np.int64), index=start.index)
+
+def build_cohorts(crm, horizon=COHORT_HORIZON):
+    """Lead month × months since lead × market/segment/source counts from crm_rows()."""
+    crm = crm.dropna(subset=['date']).copy()
+    crm['market'] = crm['market'].fillna('All Markets')
+    crm['segment'] = crm['segment'].fillna('—')
+    dims = ['date','market','segment','source']
+    parts = [crm.groupby(dims).agg(leads=('sfid','nunique')).reset_index().assign(months_since=0)]
+    for metric, col, when in [('registrations','registered','reg_date'),
+                              ('opportunities','opportunities','opp_date'),
+                              ('orders','orders','order_date')]:
+        ev = crm.loc[crm[col] > 0, dims + [col, when]]
+        # no conversion date -> counted in the lead month; earlier than the lead -> month 0
+        lag = _months_between(ev['date'], ev[when].fillna(ev['date']))
+        ev = ev.assign(months_since=lag.clip(0, horizon))
+        parts.append(ev.groupby(dims + ['months_since'])[col].sum().rename(metric).reset_index())
+    cohorts = (pd.concat(parts, ignore_index=True)
+                 .rename(columns={'date':'lead_month'})
+                 .groupby(COHORT_KEYS, as_index=False)[['leads','registrations','opportunities','orders']]
+                 .sum())
+    cohorts['lead_month'] = cohorts['lead_month'].dt.strftime('%Y-%m-%d')
+    cohorts['months_since'] = cohorts['months_since'].astype(int)
+    return cohorts
+
+def update_cohorts(crm, existing, horizon=COHORT_HORIZON):
+    """
+    Rebuild only the cohorts that can still change. Lead months within `horizon`
+    of the latest lead (or of the latest one in `existing`, when runs are further
+    apart) are rebuilt in full. Older lead months only gain conversions in their
+    last bucket, so buckets 0..horizon-1 are kept from `existing` and the last one
+    is recomputed from the records that converted that late. Matches a --full
+    rebuild as long as `existing` was built from the same CRM history.
+    """
+    latest, prev = crm['date'].max(), pd.to_datetime(existing['lead_month']).max()
+    if pd.isna(latest):
+        return existing
+    if pd.isna(prev):
+        return build_cohorts(crm, horizon)
+    open_from = min(latest, prev + pd.DateOffset(months=1)) - pd.DateOffset(months=horizon)
+    lead = _months(crm['date'])
+    is_old = lead < np.datetime64(open_from, 'M')
+    late = np.zeros(len(crm), dtype=bool)   # converted `horizon`+ months after the lead (NaT compares False)
+    for col, when in [('registered','reg_date'), ('opportunities','opp_date'), ('orders','order_date')]:
+        late |= (crm[col].to_numpy() > 0) & (_months(crm[when]) - lead >= np.timedelta64(horizon, 'M'))
+    last = build_cohorts(crm[is_old & late], horizon)
+    last = last[last['months_since'] == horizon]
+    fresh = build_cohorts(crm[~is_old], horizon)
+    kept = existing[(pd.to_datetime(existing['lead_month']) < open_from) & (existing['months_since'] < horizon)]
+    return (pd.concat([kept, last, fresh], ignore_index=True)
+              .sort_values(COHORT_KEYS, ignore_index=True))
 
 # ---------- combine ----------
-if not frames:
-    raise SystemExit("No source files found in ./data. Place Google, Facebook and Salesforce files and rerun.")
-
-combined = pd.concat(frames, ignore_index=True)
-# ensure all numeric fields exist
-for c in ['impressions','clicks','page_visits','signups','registrations','opportunities','orders','spend','target_cpl','leads']:
-    if c not in combined.columns:
-        combined[c] = 0
-# handle markets
-combined.loc[combined['market'].isna() & combined['campaign'].astype(str).str.startswith('AM_'), 'market'] = 'All Markets'
-combined['segment'] = combined['segment'].fillna('—')
-combined['date'] = pd.to_datetime(combined['date'], errors='coerce')
-
-# sum by grain
-agg = (combined
-       .groupby(['date','market','segment','source','campaign'], as_index=False)
-       .sum(numeric_only=True))
-
-# final formatting
-agg['date'] = agg['date'].dt.strftime('%Y-%m-%d')
-# Save
-agg.to_csv(OUT, index=False)
-print("Wrote", OUT)
+def combine(frames):
+    combined = pd.concat(frames, ignore_index=True)
+    # ensure all numeric fields exist
+    for c in ['impressions','clicks','page_visits','signups','registrations','opportunities','orders','spend','target_cpl','leads']:
+        if c not in combined.columns:
+            combined[c] = 0
+    # handle markets
+    combined.loc[combined['market'].isna() & combined['campaign'].astype(str).str.startswith('AM_'), 'market'] = 'All Markets'
+    combined['segment'] = combined['segment'].fillna('—')
+    combined['date'] = pd.to_datetime(combined['date'], errors='coerce')
+
+    # sum by grain; target_cpl is a per-source rate, so keep it rather than add it up
+    grain = ['date','market','segment','source','campaign']
+    agg = (combined.drop(columns='target_cpl')
+           .groupby(grain, as_index=False)
+           .sum(numeric_only=True))
+    agg = agg.merge(combined.groupby(grain, as_index=False)['target_cpl'].max(), on=grain)
+    agg = agg[[c for c in combined.columns if c in agg.columns]]
+
+    # final formatting
+    agg['date'] = agg['date'].dt.strftime('%Y-%m-%d')
+    return agg
+
+def main(data_dir=DATA_DIR, out=OUT, out_cohorts=OUT_COHORTS, full=False):
+    frames, crm = [], None
+    g_path = next(data_dir.glob('MSME_Google Data*.csv'), None)
+    if g_path:
+        frames.append(prep_google(read_google(g_path)))
+    fb_path = next(data_dir.glob('MSME_FB_Data*.xlsx'), None)
+    if fb_path:
+        frames.append(prep_facebook(read_facebook(fb_path)))
+    sf_path = next(data_dir.glob('MSME Master Data*.csv'), None)
+    if sf_path:
+        sf = read_salesforce(sf_path)
+        if sf is not None:
+            crm = crm_rows(sf)
+            frames.append(aggregate_crm(crm))
+
+    if not frames:
+        raise SystemExit(f"No source files found in ./{data_dir}. Place Google, Facebook and Salesforce files and rerun.")
+
+    agg = combine(frames)
+    # Save
+    agg.to_csv(out, index=False)
+    print("Wrote", out)
+
+    if crm is not None:
+        if out_cohorts.exists() and not full:
+            cohorts = update_cohorts(crm, pd.read_csv(out_cohorts))
+        else:
+            cohorts = build_cohorts(crm)
+        cohorts.to_csv(out_cohorts, index=False)
+        print("Wrote", out_cohorts)
+
+if __name__ == '__main__':
+    import sys
+    main(full='--full' in sys.argv[1:])
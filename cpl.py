@@ -0,0 +1,147 @@
+# cpl.py — Target CPL and campaign aggregation for the Targets app (app (1).py)
+"""
+Pure pandas functions behind "MSME – 3-Month Target CPL & Campaign Performance".
+Kept free of Streamlit so they can be cached by the app and timed by bench.py.
+"""
+import pandas as pd
+import numpy as np
+
+import optimizer as op
+
+def read_tabular(file):
+    name = file.name.lower()
+    if name.endswith('.csv'):
+        df = pd.read_csv(file)
+    elif name.endswith('.xlsx') or name.endswith('.xls'):
+        df = pd.read_excel(file, engine='openpyxl')
+    else:
+        raise ValueError("Please upload a CSV or XLSX file.")
+    # Trim headers
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def parse_option_a(df_option_a):
+    """Clean State / BU, parse Month into Month_Period and coerce Leads / Marketing Cost."""
+    df = df_option_a.copy()
+    # Clean
+    df['State'] = df['State'].astype(str).str.strip()
+    df['Business Unit'] = df['Business Unit'].astype(str).str.strip()
+    # Parse Month
+    # Accept YYYY-MM, YYYY/MM, or full date; coerce to month period
+    def to_period(x):
+        x = str(x).strip()
+        # Try common formats
+        for fmt in ("%Y-%m", "%Y/%m", "%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%m/%d/%Y"):
+            try:
+                return pd.to_datetime(x, format=fmt).to_period('M')
+            except Exception:
+                pass
+        # Fallback to pandas parser
+        try:
+            return pd.to_datetime(x, dayfirst=True).to_period('M')
+        except Exception:
+            return pd.NaT
+    df['Month_Period'] = df['Month'].apply(to_period)
+    df = df.dropna(subset=['Month_Period']).copy()
+
+    # Numerics
+    df['Leads'] = pd.to_numeric(df['Leads'], errors='coerce')
+    df['Marketing Cost'] = pd.to_numeric(df['Marketing Cost'], errors='coerce')
+    df = df.replace([np.inf, -np.inf], np.nan)
+    return df
+
+def compute_targets(df_option_a, use_weighted=False):
+    # Expect columns: State | Business Unit | Month (YYYY-MM or date) | Leads | Marketing Cost
+    req = ['State', 'Business Unit', 'Month', 'Leads', 'Marketing Cost']
+    missing = [c for c in req if c not in df_option_a.columns]
+    if missing:
+        raise ValueError(f"Missing required columns in Option A file: {missing}")
+
+    df = parse_option_a(df_option_a)
+
+    # Compute monthly CPL
+    df['CPL'] = df['Marketing Cost'] / df['Leads']
+
+    # For each State × BU, take latest 3 distinct months present
+    results = []
+    for (state, bu), grp in df.groupby(['State', 'Business Unit']):
+        grp = grp.dropna(subset=['CPL', 'Month_Period'])
+        if grp.empty:
+            continue
+        # Order by month asc to slice last 3
+        grp = grp.sort_values('Month_Period')
+        # Take last 3 months present
+        months = grp['Month_Period'].drop_duplicates().sort_values().to_list()
+        last3 = months[-3:]
+        grp3 = grp[grp['Month_Period'].isin(last3)].copy()
+        if grp3.empty:
+            continue
+        if use_weighted:
+            # Weighted by Leads
+            w = grp3['Leads'].fillna(0)
+            # Avoid divide-by-zero: if sum(w)==0, fallback to simple mean
+            if w.sum() > 0:
+                target = np.average(grp3['CPL'].fillna(0), weights=w)
+            else:
+                target = grp3['CPL'].mean()
+        else:
+            target = grp3['CPL'].mean()
+        results.append({'State': state, 'Business Unit': bu, 'Target_CPL': round(float(target), 2), 'Months_Used': ', '.join([str(p) for p in last3])})
+
+    targets = pd.DataFrame(results)
+    return targets
+
+def aggregate_campaigns(df_enriched, start_date=None, end_date=None, states=None, bu=None):
+    # Expect columns in enriched: Account SF Id, Created Date, Auto state, utm_source, utm_campaign, utm_medium,
+    # Account Record Type, Business Unit, Registered, Opportunity Count, Success Opportunity Count, OGA_Flag, ROGA_Flag
+    req = ['Account SF Id','Created Date','Auto state','Business Unit','utm_source','utm_campaign','utm_medium','Registered','OGA_Flag','ROGA_Flag']
+    missing = [c for c in req if c not in df_enriched.columns]
+    if missing:
+        raise ValueError(f"Missing required columns in enriched file: {missing}")
+
+    df = df_enriched.copy()
+    # Parse dates
+    df['Created Date Parsed'] = pd.to_datetime(df['Created Date'], errors='coerce', dayfirst=True)
+
+    # Filters
+    if start_date is not None:
+        df = df[df['Created Date Parsed'] >= pd.to_datetime(start_date)]
+    if end_date is not None:
+        df = df[df['Created Date Parsed'] <= pd.to_datetime(end_date)]
+    if states:
+        df = df[df['Auto state'].astype(str).isin(states)]
+    if bu:
+        df = df[df['Business Unit'].astype(str).isin(bu)]
+
+    # Ensure ints
+    for c in ['Registered','OGA_Flag','ROGA_Flag']:
+        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype(int)
+
+    # Aggregate at campaign level
+    group_cols = ['utm_source','utm_medium','utm_campaign','Auto state','Business Unit']
+    agg = df.groupby(group_cols).agg(
+        Accounts=('Account SF Id','nunique'),
+        Registrations=('Registered','sum'),
+        OGA_Accounts=('OGA_Flag','sum'),
+        Repeat_OGA_Accounts=('ROGA_Flag','sum')
+    ).reset_index()
+
+    # Additional rates
+    agg['Registration Rate'] = (agg['Registrations'] / agg['Accounts']).replace([np.inf, -np.inf], np.nan).round(3)
+    agg['Repeat/OGA %'] = (agg['Repeat_OGA_Accounts'] / agg['OGA_Accounts']).replace([np.inf, -np.inf], np.nan).round(3)
+    return agg
+
+def response_curves(df_option_a, targets=None):
+    """
+    Monthly Marketing Cost → Leads curves per State × BU (optimizer.fit_response),
+    with Target_CPL merged from compute_targets when given.
+    """
+    df = parse_option_a(df_option_a)
+    keys = ['State', 'Business Unit']
+    curves = op.fit_response(df.dropna(subset=['Leads', 'Marketing Cost']), keys,
+                             spend='Marketing Cost', outcome='Leads', date='Month_Period')
+    if targets is not None and not targets.empty:
+        curves = curves.merge(targets[keys + ['Target_CPL']], on=keys, how='left')
+    else:
+        curves['Target_CPL'] = np.nan
+    return curves
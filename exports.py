@@ -0,0 +1,241 @@
+# exports.py — chunked, compressed report exports with an on-disk artifact cache
+"""
+Downloads for both apps. A report is one or more named sheets (DataFrames)
+written as CSV, gzip CSV, Parquet or multi-sheet XLSX:
+
+- CSV is encoded and written CHUNK_ROWS rows at a time, so a large result is
+  never held as one full-size string plus its encoded copy.
+- Parquet writes one row group per chunk (needs pyarrow; hidden otherwise).
+- XLSX uses openpyxl's write-only mode and splits sheets past Excel's row limit.
+- CSV / Parquet with several sheets become a zip with one file per sheet.
+
+Artifacts are written to EXPORT_DIR under "<stem>-<signature>" where the
+signature hashes the data source and every filter / option that shapes the
+sheets. A repeat download with the same signature reads the finished file back
+instead of rebuilding it; the cache is pruned oldest-first past MAX_CACHE_MB.
+
+Usage in a Streamlit script:
+    sig = exports.signature(exports.source_key(uploaded), months, markets)
+    exports.render(st, "campaigns", "Campaign_Aggregation", sig, {"Campaigns": agg})
+"""
+import gzip, hashlib, json, os, tempfile, zipfile
+from pathlib import Path
+
+import pandas as pd
+
+import perf
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # Parquet export is offered only when pyarrow is installed
+    pa = pq = None
+
+CHUNK_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_575        # per sheet, excluding the header row
+AUTO_ROWS = 50_000                # smaller reports are built without a "Prepare" click
+EXPORT_DIR = Path(os.environ.get("EXPORT_CACHE_DIR", Path(tempfile.gettempdir()) / "msme_exports"))
+MAX_CACHE_MB = int(os.environ.get("EXPORT_CACHE_MB", 512))
+
+FORMATS = {   # label: (extension, mime)
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def available_formats():
+    return [k for k in FORMATS if k != "Parquet" or pq is not None]
+
+
+# ----------------------- Signatures -----------------------
+def source_key(src):
+    """Identity of an input: uploaded file (name, size, id) or path (+ mtime when local)."""
+    if src is None:
+        return None
+    if hasattr(src, "read"):
+        return [getattr(src, "name", None), getattr(src, "size", None), getattr(src, "file_id", None)]
+    p = Path(str(src))
+    return [str(src), p.stat().st_mtime if p.exists() else None]
+
+
+def frame_key(df):
+    """Content hash of a (small) DataFrame, for results whose inputs are awkward to enumerate."""
+    h = hashlib.sha1(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:12]
+
+
+def signature(*parts):
+    """Short stable hash of filter values / options (lists, dates, numbers, strings)."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+
+
+# ----------------------- Writers -----------------------
+def iter_csv(df, chunk_rows=CHUNK_ROWS):
+    """UTF-8 CSV bytes, one chunk of rows at a time (header on the first)."""
+    if df.empty:
+        yield df.to_csv(index=False).encode("utf-8")
+        return
+    for i in range(0, len(df), chunk_rows):
+        yield df.iloc[i:i + chunk_rows].to_csv(index=False, header=(i == 0)).encode("utf-8")
+
+
+def write_csv(df, fh, chunk_rows=CHUNK_ROWS):
+    for chunk in iter_csv(df, chunk_rows):
+        fh.write(chunk)
+
+
+def write_csv_gz(df, fh, chunk_rows=CHUNK_ROWS):
+    with gzip.GzipFile(fileobj=fh, mode="wb", compresslevel=6) as gz:
+        write_csv(df, gz, chunk_rows)
+
+
+def write_parquet(df, fh, chunk_rows=CHUNK_ROWS):
+    if pq is None:
+        raise ImportError("Parquet export needs pyarrow.")
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fh, schema, compression="snappy") as w:
+        for i in range(0, max(len(df), 1), chunk_rows):
+            w.write_table(pa.Table.from_pandas(df.iloc[i:i + chunk_rows], schema=schema, preserve_index=False))
+
+
+def _excel_rows(chunk):
+    """Plain Python cell values: NaN/NaT → empty, periods/categoricals → text."""
+    out = chunk.astype(object)
+    for c in chunk.columns:
+        if isinstance(chunk[c].dtype, (pd.PeriodDtype, pd.CategoricalDtype, pd.IntervalDtype)):
+            out[c] = chunk[c].astype(str)
+    return out.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_xlsx(sheets, fh, chunk_rows=CHUNK_ROWS):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        parts = range(0, max(len(df), 1), EXCEL_MAX_ROWS)
+        for k, start in enumerate(parts):
+            title = (name[:31] if k == 0 else f"{name[:26]} ({k + 1})").replace("/", "-")
+            ws = wb.create_sheet(title=title)
+            ws.append([str(c) for c in df.columns])
+            part = df.iloc[start:start + EXCEL_MAX_ROWS]
+            for i in range(0, len(part), chunk_rows):
+                for row in _excel_rows(part.iloc[i:i + chunk_rows]):
+                    ws.append(row)
+    wb.save(fh)
+
+
+SINGLE_WRITERS = {"CSV": write_csv, "CSV (gzip)": write_csv_gz, "Parquet": write_parquet}
+
+
+def file_name(stem, fmt, sheets):
+    """Download name: <stem><ext>, or <stem>.zip for CSV / Parquet with several sheets."""
+    ext = FORMATS[fmt][0]
+    return f"{stem}.zip" if len(sheets) > 1 and fmt != "Excel (XLSX)" else f"{stem}{ext}"
+
+
+def write(sheets, fmt, fh, chunk_rows=CHUNK_ROWS):
+    """Write sheets ({name: DataFrame}) in fmt to a binary file object."""
+    if fmt == "Excel (XLSX)":
+        return write_xlsx(sheets, fh, chunk_rows)
+    writer, ext = SINGLE_WRITERS[fmt], FORMATS[fmt][0]
+    if len(sheets) == 1:
+        return writer(next(iter(sheets.values())), fh, chunk_rows)
+    # CSV members are already text; gzip/Parquet members are stored as-is
+    method = zipfile.ZIP_DEFLATED if fmt == "CSV" else zipfile.ZIP_STORED
+    with zipfile.ZipFile(fh, "w", compression=method) as zf:
+        for name, df in sheets.items():
+            with zf.open(f"{name}{ext}", "w", force_zip64=True) as member:
+                writer(df, member, chunk_rows)
+
+
+# ----------------------- Artifact cache -----------------------
+def artifact_path(stem, fmt, sig):
+    return EXPORT_DIR / f"{stem}-{sig}{FORMATS[fmt][0]}"
+
+
+def _prune(keep):
+    """Drop the oldest finished artifacts past MAX_CACHE_MB; other sessions' .part files are left alone."""
+    files = []
+    for p in EXPORT_DIR.glob("*"):
+        if p.name.endswith(".part"):
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:   # removed by another session meanwhile
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    total = 0
+    for _, size, p in sorted(files, key=lambda t: t[0], reverse=True):
+        total += size
+        if total > MAX_CACHE_MB * 1024 * 1024 and p != keep:
+            try:
+                p.unlink(missing_ok=True)
+            except OSError:   # still open elsewhere (Windows)
+                pass
+
+
+def artifact(stem, fmt, sig, sheets):
+    """
+    Path of the finished export ({name: DataFrame} in fmt), building it on a miss.
+    """
+    path = artifact_path(stem, fmt, sig)
+    try:
+        os.utime(path)   # keep recently used artifacts through pruning
+        perf.count("export.hit")
+        return path
+    except FileNotFoundError:
+        perf.count("export.miss")
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    # sessions are threads of one process: each build gets its own temp file
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{path.name}.", suffix=".part")
+    tmp = Path(tmp)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(sheets, fmt, fh)
+        try:
+            os.replace(tmp, path)   # atomic: concurrent sessions never see half a file
+        except OSError:
+            if not path.exists():   # lost the race to an identical build → use that one
+                raise
+    finally:
+        tmp.unlink(missing_ok=True)
+    _prune(keep=path)
+    return path
+
+
+def _open_artifact(stem, fmt, sig, sheets):
+    """Open the artifact for reading; if another session pruned it after the lookup, rebuild once."""
+    try:
+        return open(artifact(stem, fmt, sig, sheets), "rb")
+    except FileNotFoundError:
+        return open(artifact(stem, fmt, sig, sheets), "rb")
+
+
+# ----------------------- Streamlit widget -----------------------
+def render(container, key, stem, sig, sheets, label="Export", formats=None):
+    """
+    Format picker + download button. Reports up to AUTO_ROWS rows are served on
+    every rerun. download_button reads its whole file each time it is drawn, so
+    larger ones sit behind a "Prepare" button and are only served on the rerun
+    where it is clicked; the artifact cache makes repeat clicks cheap.
+    """
+    formats = formats or available_formats()
+    fmt = container.selectbox(f"{label} format", formats, key=f"{key}_fmt")
+    rows = sum(len(d) for d in sheets.values())
+    if rows > AUTO_ROWS:
+        ready = artifact_path(stem, fmt, sig).exists()
+        if not container.button(f"{'Get' if ready else 'Prepare'} {fmt} export", key=f"{key}_prep",
+                                help=f"{rows:,} rows — built in chunks and cached for repeat downloads."):
+            return None
+    with perf.span(f"export.{key}", fmt=fmt) as sp:
+        fh = _open_artifact(stem, fmt, sig, sheets)
+        sp['kb'] = round(os.fstat(fh.fileno()).st_size / 1024, 1)
+    name = file_name(stem, fmt, sheets)
+    with fh:
+        container.download_button(f"Download {name}", data=fh, file_name=name,
+                                  mime="application/zip" if name.endswith(".zip") else FORMATS[fmt][1],
+                                  key=f"{key}_dl")
+    return Path(fh.name)
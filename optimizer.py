@@ -0,0 +1,165 @@
+# optimizer.py — budget reallocation over diminishing-returns response curves
+"""
+Fit a response curve per unit (market × source, or State × BU) from monthly
+history and reallocate a total budget to maximise forecast leads (or
+registrations) under target-CPL caps.
+
+Response curve: outcome = a · spend^b with 0 < b < 1 (diminishing returns),
+fitted by log-log least squares per unit; units with too little history or
+no spend variation get the pooled elasticity b.
+
+Given a multiplier λ, the optimum of a concave separable objective under a total
+budget is x_i = (a_i b_i / λ)^(1 / (1 - b_i)) clipped to the unit's bounds; λ is
+found by bisection. Everything is numpy over a (scenarios × units) array, so a
+sweep of thousands of budgets is a single solve.
+
+Bounds per unit: spend may move at most ±max_shift from today's spend (the curve
+is only trusted near observed spend), and never past the spend at which the
+unit's average CPL (spend / leads) hits its target CPL.
+"""
+import pandas as pd
+import numpy as np
+
+B_RANGE = (0.2, 0.95)   # elasticity clip: below 1 keeps returns diminishing
+
+
+# ----------------------- Fitting -----------------------
+def fit_response(hist, keys, spend='spend', outcome='leads', date='date', min_points=3, recent=3):
+    """
+    hist: monthly rows with keys, date, spend and outcome.
+    Returns one row per unit: keys, a, b, n_points, spend_now / outcome_now
+    (mean of the last `recent` months), fitted only on months with spend > 0 and outcome > 0.
+    """
+    h = hist.groupby(keys + [date], as_index=False)[[spend, outcome]].sum()
+    h = h[(h[spend] > 0) & (h[outcome] > 0)].copy()
+    if h.empty:
+        return pd.DataFrame(columns=keys + ['a', 'b', 'n_points', 'spend_now', 'outcome_now'])
+    h['lx'], h['ly'] = np.log(h[spend]), np.log(h[outcome])
+    h['lxx'], h['lxy'] = h['lx'] ** 2, h['lx'] * h['ly']
+    g = h.groupby(keys).agg(n_points=('lx', 'size'), sx=('lx', 'sum'), sy=('ly', 'sum'),
+                            sxx=('lxx', 'sum'), sxy=('lxy', 'sum'))
+    mx, my = g['sx'] / g['n_points'], g['sy'] / g['n_points']
+    var = g['sxx'] / g['n_points'] - mx ** 2
+    cov = g['sxy'] / g['n_points'] - mx * my
+    # pooled elasticity from within-unit (demeaned) variation
+    pooled = cov.mul(g['n_points']).sum() / var.mul(g['n_points']).sum() if var.mul(g['n_points']).sum() > 1e-9 else 0.6
+    ok = (g['n_points'] >= min_points) & (var > 1e-6)
+    b = np.where(ok, cov / var.where(var > 1e-6, 1), pooled)
+    g['b'] = np.clip(np.nan_to_num(b, nan=0.6), *B_RANGE)
+    g['a'] = np.exp(my - g['b'] * mx)
+
+    last = h.sort_values(date).groupby(keys).tail(recent).groupby(keys)[[spend, outcome]].mean()
+    g['spend_now'], g['outcome_now'] = last[spend], last[outcome]
+    return g.reset_index()[keys + ['a', 'b', 'n_points', 'spend_now', 'outcome_now']]
+
+
+def response(a, b, x):
+    """Forecast outcome for spend x (broadcasts over scenarios × units)."""
+    return a * np.power(np.maximum(x, 0), b)
+
+
+def cpl_cap(a, b, target_cpl):
+    """Largest spend at which spend / response(spend) stays <= target CPL (inf if no target)."""
+    t = np.where((target_cpl > 0) & np.isfinite(target_cpl), target_cpl, np.inf)
+    with np.errstate(over='ignore', divide='ignore'):
+        return np.power(a * t, 1.0 / (1.0 - b))
+
+
+# ----------------------- Solving -----------------------
+def solve(a, b, lo, hi, budgets, iters=60):
+    """
+    Optimal spend per unit for each budget: array (len(budgets), units).
+    Budgets outside [sum(lo), sum(hi)] are clipped to what the bounds allow.
+    """
+    a, b, lo, hi = (np.asarray(v, dtype=float)[None, :] for v in (a, b, lo, hi))
+    budgets = np.clip(np.atleast_1d(np.asarray(budgets, dtype=float)), lo.sum(), hi.sum())[:, None]
+    if a.size == 0:
+        return np.zeros((len(budgets), 0))
+    e = 1.0 / (1.0 - b)
+    ab = np.maximum(a * b, 1e-300)
+    # bracket log λ by the marginal returns at the bounds: x(λ) = hi below, lo above
+    lam_at = lambda x: np.log(ab) + (b - 1) * np.log(np.maximum(x, 1e-9))
+    l_lo = np.full(budgets.shape, lam_at(hi).min() - 1.0)
+    l_hi = np.full(budgets.shape, lam_at(lo).max() + 1.0)
+    for _ in range(iters):
+        mid = (l_lo + l_hi) / 2
+        x = np.clip(np.exp(e * (np.log(ab) - mid)), lo, hi)
+        over = x.sum(axis=1, keepdims=True) > budgets
+        l_lo, l_hi = np.where(over, mid, l_lo), np.where(over, l_hi, mid)
+    x = np.clip(np.exp(e * (np.log(ab) - l_hi)), lo, hi)
+    # bisection leaves a sliver unspent; hand it to units with headroom pro rata
+    gap = budgets - x.sum(axis=1, keepdims=True)
+    room = hi - x
+    share = np.divide(room, room.sum(axis=1, keepdims=True), out=np.zeros_like(room),
+                      where=room.sum(axis=1, keepdims=True) > 0)
+    return x + np.clip(gap, 0, None) * share
+
+
+def bounds(curves, max_shift=0.5, target_cpl=None):
+    """(lo, hi) spend per unit: ±max_shift around spend_now, capped by target CPL."""
+    now = curves['spend_now'].to_numpy(dtype=float)
+    hi = now * (1 + max_shift)
+    if target_cpl is not None:
+        hi = np.minimum(hi, cpl_cap(curves['a'].to_numpy(), curves['b'].to_numpy(), np.asarray(target_cpl, dtype=float)))
+    lo = np.minimum(now * (1 - max_shift), hi)
+    return lo, hi
+
+
+def plan(curves, budget, max_shift=0.5, target_cpl=None, scale=None):
+    """
+    Optimal allocation table for one budget: the curves (minus a) with spend_opt,
+    spend_change, forecast leads now / optimised, cpl_opt and objective_now / _opt.
+    `scale` converts leads into the objective (e.g. registrations per lead; default 1)
+    and drives the allocation; CPL caps and the leads / CPL columns stay on leads.
+    """
+    a, b = curves['a'].to_numpy(), curves['b'].to_numpy()
+    w = 1.0 if scale is None else np.asarray(scale, dtype=float)
+    lo, hi = bounds(curves, max_shift, target_cpl)
+    # w·a·x^b = (w·a)·x^b: the objective is another power curve, so solve on w·a
+    x = solve(a * w, b, lo, hi, [budget])[0]
+    out = curves.drop(columns=['a']).copy()
+    out['spend_opt'] = x
+    out['spend_change'] = out['spend_opt'] - out['spend_now']
+    out['leads_now_fc'] = response(a, b, out['spend_now'].to_numpy())
+    out['leads_opt_fc'] = response(a, b, x)
+    out['cpl_opt'] = x / np.where(out['leads_opt_fc'] > 0, out['leads_opt_fc'], np.nan)
+    out['objective_now'] = out['leads_now_fc'] * w
+    out['objective_opt'] = out['leads_opt_fc'] * w
+    return out
+
+
+def frontier(curves, budgets, max_shift=0.5, target_cpl=None, scale=None):
+    """
+    Objective vs total budget for every budget in one batched solve, next to the
+    current mix scaled proportionally to the same spend (budgets beyond the bounds
+    are only partly spent, see 'spent').
+    """
+    a, b = curves['a'].to_numpy(), curves['b'].to_numpy()
+    w = 1.0 if scale is None else np.asarray(scale, dtype=float)
+    lo, hi = bounds(curves, max_shift, target_cpl)
+    budgets = np.asarray(budgets, dtype=float)
+    x = solve(a * w, b, lo, hi, budgets)
+    now = curves['spend_now'].to_numpy(dtype=float)
+    spent = x.sum(axis=1)
+    prop = now[None, :] * (spent / now.sum() if now.sum() > 0 else np.zeros_like(spent))[:, None]
+    return pd.DataFrame({
+        'budget': budgets,
+        'spent': spent,
+        'optimal': response(a * w, b, x).sum(axis=1),
+        'current_mix': response(a * w, b, prop).sum(axis=1),
+    })
+
+
+if __name__ == '__main__':
+    # Regression check: a per-unit scale must move spend, not just relabel the objective.
+    toy = pd.DataFrame({'a': [10.0, 10.0], 'b': [0.5, 0.5], 'spend_now': [10_000.0, 10_000.0]})
+    leads = plan(toy, 20_000)
+    regs = plan(toy, 20_000, scale=[0.5, 0.05])
+    assert np.allclose(leads['spend_opt'], [10_000, 10_000])
+    assert regs['spend_opt'][0] > 14_999 and regs['objective_opt'].sum() > leads['leads_opt_fc'].mul([0.5, 0.05]).sum()
+    fr = frontier(toy, [20_000], scale=[0.5, 0.05])
+    assert np.isclose(fr['optimal'][0], regs['objective_opt'].sum())
+    empty = toy.iloc[:0]
+    assert solve(empty['a'], empty['b'], [], [], [1.0, 2.0]).shape == (2, 0)
+    assert len(plan(empty, 1.0)) == 0 and frontier(empty, [1.0, 2.0])['optimal'].eq(0).all()
+    print("optimizer checks passed:", regs[['spend_opt', 'objective_opt']].round(1).to_dict('list'))
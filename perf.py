@@ -0,0 +1,194 @@
+# perf.py — lightweight rerun instrumentation for the Streamlit apps
+"""
+Timed spans, cache hit/miss counters and (optional) peak memory per span.
+
+Usage in a Streamlit script:
+    perf.begin_run("app", trace_memory=st.session_state.get("perf_debug", False))
+
+    @perf.cached("load_df", st.cache_data(show_spinner=False))
+    def load_df(src): ...
+
+    with perf.span("filter") as sp:
+        ...
+        sp['rows'] = len(f)
+
+    perf.end_run()
+    perf.render_panel(st.sidebar)
+
+Every finished span and every rerun summary is written as one JSON line on the
+'perf' logger (stderr by default; set PERF_LOG_FILE to also append to a file,
+PERF_LOG_LEVEL=WARNING to silence).
+
+Peak memory uses tracemalloc, which slows allocation-heavy code, so it is only
+switched on when PERF_TRACE_MEMORY=1 or when the caller asks for it (the apps
+do so while the debug panel is open). It is stopped again only once no live
+script thread wants it. tracemalloc is process-wide: with several concurrent
+sessions the peaks are indicative, not exact.
+"""
+import functools, json, logging, os, threading, time, tracemalloc, uuid
+from collections import Counter
+from contextlib import contextmanager
+
+log = logging.getLogger("perf")
+_local = threading.local()
+_tracers = set()          # idents of threads whose current run wants memory traced
+_tracers_lock = threading.Lock()
+
+
+def _setup_logging():
+    if log.handlers:
+        return
+    fmt = logging.Formatter("%(message)s")
+    h = logging.StreamHandler()
+    h.setFormatter(fmt)
+    log.addHandler(h)
+    if os.environ.get("PERF_LOG_FILE"):
+        fh = logging.FileHandler(os.environ["PERF_LOG_FILE"])
+        fh.setFormatter(fmt)
+        log.addHandler(fh)
+    log.setLevel(os.environ.get("PERF_LOG_LEVEL", "INFO").upper())
+    log.propagate = False
+
+
+class Run:
+    """Spans and counters collected during one script rerun (one per thread)."""
+    def __init__(self, app, trace_memory=False):
+        self.app = app
+        self.run_id = uuid.uuid4().hex[:8]
+        self.trace_memory = trace_memory
+        self.spans = []          # span records, in start order
+        self.stack = []          # open span records
+        self.counters = Counter()
+        self.t0 = time.perf_counter()
+        self.total_ms = None
+
+
+def current():
+    run = getattr(_local, 'run', None)
+    if run is None:
+        run = _local.run = Run('script')
+    return run
+
+
+def begin_run(app, trace_memory=False):
+    """Start a fresh collector for this rerun. Returns the Run."""
+    _setup_logging()
+    trace_memory = bool(trace_memory) or os.environ.get("PERF_TRACE_MEMORY") == "1"
+    # tracemalloc is process-wide: only stop it when no live session still wants it
+    with _tracers_lock:
+        me = threading.get_ident()
+        if trace_memory:
+            _tracers.add(me)
+        else:
+            _tracers.discard(me)
+        _tracers.intersection_update(t.ident for t in threading.enumerate())
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _tracers and tracemalloc.is_tracing() and os.environ.get("PERF_TRACE_MEMORY") != "1":
+            tracemalloc.stop()
+    _local.run = Run(app, trace_memory=trace_memory)
+    return _local.run
+
+
+def count(name, n=1):
+    current().counters[name] += n
+
+
+def _emit(run, rec):
+    log.info(json.dumps({"event": "span", "app": run.app, "run": run.run_id, **rec}, default=str))
+
+
+@contextmanager
+def span(name, **tags):
+    """Time a block; yields the span record (a dict) so callers can add tags."""
+    run = current()
+    tracing = run.trace_memory and tracemalloc.is_tracing()
+    parent = run.stack[-1] if run.stack else None
+    rec = {"span": name, "parent": parent["span"] if parent else None,
+           "depth": len(run.stack), **tags}
+    if tracing:
+        cur, peak = tracemalloc.get_traced_memory()
+        # fold the peak seen so far into the parent before resetting it for this span
+        if parent is not None:
+            parent["_peak"] = max(parent["_peak"], peak - parent["_base"])
+        tracemalloc.reset_peak()
+        rec["_base"], rec["_peak"] = cur, 0
+    run.stack.append(rec)
+    run.spans.append(rec)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        run.stack.pop()
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            rec["_peak"] = max(rec["_peak"], peak - rec["_base"])
+            if parent is not None:
+                parent["_peak"] = max(parent["_peak"], peak - parent["_base"])
+            rec["peak_kb"] = round(rec.pop("_peak") / 1024, 1)
+            rec.pop("_base")
+        _emit(run, rec)
+
+
+def cached(name, cache_decorator):
+    """
+    Wrap a cache decorator (e.g. st.cache_data(...)) so every call is a span and
+    hits/misses are counted. The function body only runs on a miss, so misses are
+    counted from inside the cached function and hits = calls - misses.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def fill(*args, **kwargs):
+            count(f"{name}.miss")
+            return fn(*args, **kwargs)
+        cached_fn = cache_decorator(fill)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            run = current()
+            with span(name) as rec:
+                before = run.counters[f"{name}.miss"]
+                out = cached_fn(*args, **kwargs)
+                miss = run.counters[f"{name}.miss"] > before
+                rec["cache"] = "miss" if miss else "hit"
+                if not miss:
+                    count(f"{name}.hit")
+            return out
+        if hasattr(cached_fn, 'clear'):
+            call.clear = cached_fn.clear
+        return call
+    return deco
+
+
+def end_run():
+    """Close the rerun and log a one-line summary."""
+    run = current()
+    run.total_ms = round((time.perf_counter() - run.t0) * 1000, 2)
+    log.info(json.dumps({"event": "run", "app": run.app, "run": run.run_id,
+                         "total_ms": run.total_ms, "spans": len(run.spans),
+                         "counters": dict(run.counters)}))
+    return run
+
+
+def spans_frame(run=None):
+    import pandas as pd
+    run = run or current()
+    df = pd.DataFrame(run.spans)
+    if df.empty:
+        return df
+    df['span'] = ['  ' * int(d) + s for d, s in zip(df['depth'], df['span'])]
+    cols = [c for c in ['span', 'ms', 'peak_kb', 'cache', 'rows'] if c in df.columns]
+    return df[cols + [c for c in df.columns if c not in cols + ['parent', 'depth']]]
+
+
+def render_panel(container, run=None):
+    """Render the timing table and cache counters into a Streamlit container."""
+    run = run or current()
+    total = run.total_ms if run.total_ms is not None else round((time.perf_counter() - run.t0) * 1000, 2)
+    container.caption(f"Rerun {run.run_id} — {total:,.0f} ms total"
+                      + (" • memory traced" if run.trace_memory else ""))
+    container.dataframe(spans_frame(run), hide_index=True, use_container_width=True)
+    if run.counters:
+        container.json(dict(sorted(run.counters.items())))
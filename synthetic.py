@@ -0,0 +1,268 @@
+# synthetic.py — reproducible synthetic inputs for the benchmark suite
+"""
+Generate Google, Facebook and Salesforce (MSME Master) inputs, the enriched CRM
+export, an Option A file and a consolidated CSV with realistic shapes:
+
+- campaign names are state-prefixed (MH_LG_..., AM_..., Search-...) plus a few
+  unprefixed ones, with a long-tailed (Zipf-like) popularity
+- CRM utm_source / utm_campaign / Auto State come in the messy variants seen in
+  Salesforce exports (GG / google / meta-fb / ig / moe, case & whitespace noise)
+- ~15% of rows re-use another row's Account SF Id, so COUNT DISTINCT matters
+- registration / first opportunity / first order dates trail the lead by a
+  geometric number of months, so cohort lag curves have a realistic shape
+
+Everything is vectorised numpy and seeded, so a tier always yields the same data.
+Tiers run from 10k to 10M rows (TIERS). Option A is a monthly State × BU summary,
+so it is generated at 1/100th of the tier size.
+
+Run: python synthetic.py --tier 100k --out bench_data
+"""
+import argparse
+import numpy as np, pandas as pd
+from pathlib import Path
+
+from consolidate import STATE_MAP, TARGET_CPL, extract_state
+
+TIERS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+EXCEL_MAX_ROWS = 1_048_575
+
+MONTHS = pd.period_range('2023-04', '2025-06', freq='M')
+STATE_CODES = [c for c in STATE_MAP if c != 'AM']
+# rough share of MSME activity by state (MH/GJ/TN/KA dominate)
+STATE_W = np.array([22, 12, 11, 14, 6, 5, 6, 5, 5, 4, 3, 1, 2], dtype=float)
+BUS = ['Manufacturing', 'Construct', 'Infra', 'Retail']
+CAMPAIGN_KINDS = ['LG', 'Lead', 'Retarget', 'AudienceTest', 'Conv', 'Awareness']
+UTM_SOURCES = ['google', 'Google', 'GG', 'google_ads', 'meta-fb', 'fb', 'Facebook', 'meta',
+               'meta-ig', 'ig', 'Instagram', 'moe', 'MoEngage', 'direct', 'organic', '']
+UTM_SOURCES_W = np.array([14, 6, 8, 3, 14, 6, 5, 3, 5, 4, 2, 4, 3, 6, 5, 7], dtype=float)
+UTM_MEDIUMS = ['cpc', 'paid_social', 'email', 'push', 'organic', '']
+RECORD_TYPES = ['MSME', 'Retail', 'Channel Partner', 'Enterprise']
+
+
+def _pick(rng, n, values, weights=None):
+    values = np.asarray(values, dtype=object)
+    p = None if weights is None else np.asarray(weights, dtype=float) / np.sum(weights)
+    return values[rng.choice(len(values), size=n, p=p)]
+
+
+def _zipf_idx(rng, n, k, a=1.1):
+    p = 1.0 / np.arange(1, k + 1) ** a
+    return rng.choice(k, size=n, p=p / p.sum())
+
+
+def campaign_pool(rng, k):
+    """k distinct campaign names; most are STATE_KIND_BU_ddmmyyyy."""
+    codes = _pick(rng, k, STATE_CODES + ['AM'], np.append(STATE_W, 10))
+    kinds = _pick(rng, k, CAMPAIGN_KINDS)
+    bus = _pick(rng, k, BUS)
+    days = pd.Timestamp('2023-04-01') + pd.to_timedelta(rng.integers(0, 820, k), unit='D')
+    ids = np.arange(k).astype(str).astype(object)     # keeps names distinct
+    names = pd.Series(codes).str.cat([kinds, bus, days.strftime('%d%m%Y'), ids], sep='_').to_numpy(dtype=object)
+    # ~5% Google search campaigns (All Markets) and ~3% unprefixed names (no market)
+    u = rng.random(k)
+    search, promo = u < 0.05, (u >= 0.05) & (u < 0.08)
+    names[search] = 'Search-' + bus[search] + '-' + ids[search]
+    names[promo] = 'Festive Promo ' + ids[promo]
+    return names
+
+
+def _pool_size(n):
+    return int(min(20_000, max(50, np.sqrt(n) * 4)))
+
+
+def _month_labels(rng, n, range_share):
+    """Month column as media exports it: 'YYYY-MM-01 - YYYY-MM-<last>' or 'YYYY-MM'."""
+    plain = np.array([str(m) for m in MONTHS], dtype=object)
+    ranged = np.array([f"{m.start_time:%Y-%m-%d} - {m.end_time:%Y-%m-%d}" for m in MONTHS], dtype=object)
+    idx = rng.integers(0, len(MONTHS), n)
+    return np.where(rng.random(n) < range_share, ranged[idx], plain[idx])
+
+
+def _delivery(rng, n, ctr_a, ctr_b, cpc_mu):
+    impressions = rng.lognormal(9.0, 1.4, n).astype(np.int64) + 1
+    clicks = rng.binomial(impressions, rng.beta(ctr_a, ctr_b, n))
+    spend = np.round(clicks * rng.lognormal(cpc_mu, 0.5, n), 2)
+    return impressions, clicks, spend
+
+
+def google_ads(n, seed=0):
+    rng = np.random.default_rng(seed)
+    pool = campaign_pool(rng, _pool_size(n))
+    impressions, clicks, spend = _delivery(rng, n, 2, 60, 3.0)
+    return pd.DataFrame({
+        'Campaign Name': pool[_zipf_idx(rng, n, len(pool))],
+        'Advertising Channel': _pick(rng, n, ['Search', 'Display', 'Performance Max', 'Video', 'Demand Gen'], [45, 15, 25, 5, 10]),
+        'Clicks': clicks,
+        'Impressions': impressions,
+        'Cost (Spend)': spend,
+        'Conversions': rng.binomial(clicks, 0.06),
+        'Month': _month_labels(rng, n, range_share=0.3),
+    })
+
+
+def facebook_ads(n, seed=1):
+    rng = np.random.default_rng(seed)
+    pool = campaign_pool(rng, _pool_size(n))
+    impressions, clicks, spend = _delivery(rng, n, 1.5, 120, 2.5)
+    return pd.DataFrame({
+        'Campaign Name': pool[_zipf_idx(rng, n, len(pool))],
+        'Impressions': impressions,
+        'Link Clicks': clicks,
+        'Amount Spent': spend,
+        'Results': rng.binomial(clicks, 0.09),
+        'Month': _month_labels(rng, n, range_share=0.9),
+    })
+
+
+def _crm_core(rng, n):
+    """Columns shared by the MSME Master export and the enriched CRM export."""
+    # distinct ids, with ~15% of rows re-using the id of another row
+    ids = np.arange(n)
+    dup = rng.random(n) < 0.15
+    dup[0] = False
+    orig = np.flatnonzero(~dup)
+    ids[dup] = orig[rng.integers(0, len(orig), dup.sum())]
+    sfid = pd.Series(ids).map('001{:012d}'.format)
+    days = pd.date_range(MONTHS[0].start_time, MONTHS[-1].end_time, freq='D')
+    day_labels = days.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    # Auto State: full name / upper / code / lower, some blanks
+    names = [STATE_MAP[c] for c in STATE_CODES]
+    variants = np.array([v for c, s in zip(STATE_CODES, names) for v in (s, s.upper(), c, s.lower() + ' ')], dtype=object)
+    state_i = rng.choice(len(STATE_CODES), size=n, p=STATE_W / STATE_W.sum())
+    state = variants[state_i * 4 + rng.choice(4, size=n, p=[0.6, 0.2, 0.15, 0.05])]
+    state[rng.random(n) < 0.03] = None
+    # utm_campaign: pool names with case / whitespace noise, ~10% blank
+    pool = campaign_pool(rng, _pool_size(n))
+    camp_variants = np.concatenate([pool, np.char.lower(pool.astype(str)).astype(object),
+                                    np.char.add(pool.astype(str), ' ').astype(object)])
+    camp = camp_variants[_zipf_idx(rng, n, len(pool)) + len(pool) * rng.choice(3, size=n, p=[0.8, 0.15, 0.05])]
+    camp[rng.random(n) < 0.1] = None
+    registered = (rng.random(n) < 0.35).astype(np.int64)
+    opps = rng.poisson(0.8, n) * registered
+    orders = rng.binomial(opps, 0.4)
+    # conversion dates: each step lags the previous one by a geometric number of months
+    created = rng.integers(0, len(days), n)
+    def after(d, has):
+        lag = (rng.geometric(0.55, n) - 1) * 30 + rng.integers(0, 30, n)
+        return np.where(has, np.minimum(d + lag, len(days) - 1), -1)
+    reg_d = after(created, registered == 1)
+    opp_d = after(reg_d, opps > 0)
+    order_d = after(opp_d, orders > 0)
+    label = lambda d: np.where(d >= 0, day_labels[np.maximum(d, 0)], None)
+    return {
+        'Account SF Id': sfid.to_numpy(dtype=object),
+        'Created Date': day_labels[created],
+        'Auto state': state,
+        'Account Record Type': _pick(rng, n, RECORD_TYPES, [70, 15, 10, 5]),
+        'utm_source': _pick(rng, n, UTM_SOURCES, UTM_SOURCES_W),
+        'utm_campaign': camp,
+        'Registered': registered,
+        'Opportunity Count': opps,
+        'Success Opportunity Count': orders,
+        'Registration Date': label(reg_d),
+        'First Opportunity Date': label(opp_d),
+        'First Order Date': label(order_d),
+    }
+
+
+def salesforce_master(n, seed=2):
+    rng = np.random.default_rng(seed)
+    cols = _crm_core(rng, n)
+    cols['Auto State'] = cols.pop('Auto state')
+    return pd.DataFrame(cols)
+
+
+def enriched_crm(n, seed=3):
+    rng = np.random.default_rng(seed)
+    cols = _crm_core(rng, n)
+    oga = ((rng.random(n) < 0.5) & (cols['Registered'] == 1)).astype(np.int64)
+    cols.update({
+        'Business Unit': _pick(rng, n, BUS, [45, 30, 15, 10]),
+        'utm_medium': _pick(rng, n, UTM_MEDIUMS, [35, 30, 10, 8, 10, 7]),
+        'OGA_Flag': oga,
+        'ROGA_Flag': ((rng.random(n) < 0.3) & (oga == 1)).astype(np.int64),
+    })
+    return pd.DataFrame(cols)
+
+
+def option_a(n, seed=4):
+    """State × BU × Month leads & cost for the last 12 months; ~n / 100 rows."""
+    rng = np.random.default_rng(seed)
+    n_groups = max(1, n // 1200)
+    states = np.array([STATE_MAP[c] for c in STATE_CODES], dtype=object)
+    g = np.arange(n_groups)
+    # 13 states × 4 BUs give 52 distinct pairs; beyond that BUs get a numeric suffix
+    bu = np.array([BUS[i % len(BUS)] + (f"-{i // 52}" if i >= 52 else '') for i in g], dtype=object)
+    gi = np.repeat(g, 12)
+    rows = len(gi)
+    leads = rng.poisson(rng.lognormal(6.5, 0.8, n_groups)[gi]).astype(float)
+    leads[rng.random(rows) < 0.02] = 0                      # months with no leads -> inf CPL
+    cost = np.round(leads * rng.lognormal(5.4, 0.3, rows), 0)
+    return pd.DataFrame({
+        'State': states[g % len(states)][gi],
+        'Business Unit': bu[gi],
+        'Month': np.tile(np.array([str(m) for m in MONTHS[-12:]], dtype=object), n_groups),
+        'Leads': leads,
+        'Marketing Cost': cost,
+    })
+
+
+def consolidated(n, seed=5):
+    """campaign_data_consolidated.csv schema: media rows (delivery/spend) + CRM rows (leads/regs)."""
+    rng = np.random.default_rng(seed)
+    pool = campaign_pool(rng, _pool_size(n))
+    ci = _zipf_idx(rng, n, len(pool))
+    market = np.array([extract_state(c) for c in pool], dtype=object)[ci]
+    source = _pick(rng, n, ['Google', 'Facebook', 'Instagram', 'MoEngage', 'Direct'], [35, 40, 8, 7, 10])
+    media = np.isin(source, ['Google', 'Facebook']) & (rng.random(n) < 0.6)
+    impressions, clicks, spend = _delivery(rng, n, 2, 80, 2.8)
+    leads = rng.poisson(np.where(media, 0, 25.0))
+    registrations = rng.binomial(leads, 0.35)
+    opportunities = rng.binomial(registrations, 0.5)
+    return pd.DataFrame({
+        'date': np.array([f"{m.start_time:%Y-%m-%d}" for m in MONTHS], dtype=object)[rng.integers(0, len(MONTHS), n)],
+        'market': market,
+        'segment': np.where(media, np.where(source == 'Facebook', 'Paid Social', _pick(rng, n, ['Search', 'Performance Max'], [65, 35])),
+                            _pick(rng, n, RECORD_TYPES, [70, 15, 10, 5])),
+        'source': source,
+        'campaign': pool[ci],
+        'impressions': np.where(media, impressions, 0),
+        'clicks': np.where(media, clicks, 0).astype(float),
+        'page_visits': 0.0,
+        'leads': leads.astype(float),
+        'registrations': registrations.astype(float),
+        'opportunities': opportunities.astype(float),
+        'orders': rng.binomial(opportunities, 0.4).astype(float),
+        'spend': np.where(media, spend, 0.0),
+        'target_cpl': pd.Series(source).map(TARGET_CPL).fillna(0.0).to_numpy(),
+    })
+
+
+def write_facebook(path, n):
+    """Facebook export as xlsx, capped at the sheet row limit."""
+    fb = facebook_ads(n)
+    if len(fb) > EXCEL_MAX_ROWS:
+        print(f"Facebook input truncated to {EXCEL_MAX_ROWS:,} rows (xlsx sheet limit)")
+        fb = fb.head(EXCEL_MAX_ROWS)
+    fb.to_excel(path, index=False, engine='openpyxl')
+
+
+def write_inputs(out_dir, n):
+    """Write every synthetic input under out_dir with the names the pipelines expect."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    google_ads(n).to_csv(out_dir / 'MSME_Google Data - Sheet2.csv', index=False)
+    write_facebook(out_dir / 'MSME_FB_Data.xlsx', n)
+    salesforce_master(n).to_csv(out_dir / 'MSME Master Data.csv', index=False)
+    enriched_crm(n).to_csv(out_dir / 'MSME_Master_Enriched.csv', index=False)
+    option_a(n).to_csv(out_dir / 'OptionA.csv', index=False)
+    consolidated(n).to_csv(out_dir / 'campaign_data_consolidated.csv', index=False)
+    print("Wrote", out_dir)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument('--tier', choices=TIERS, default='10k')
+    ap.add_argument('--out', default='bench_data')
+    args = ap.parse_args()
+    write_inputs(Path(args.out) / args.tier, TIERS[args.tier])